@@ -7,12 +7,11 @@ import os.path
 import socket
 import sys
 from pathlib import Path
-import tempfile
-import re
 import glob
 
 from atlantic_signatures.client import Client
 from atlantic_signatures.host import Host
+from atlantic_signatures.run_file import FLUSH_INTERVAL
 
 
 # assume we are running as host if the OS is Windows
@@ -21,19 +20,53 @@ RUNNING_AS_HOST = os.environ.get('RUNNING_AS_HOST', sys.platform == 'win32')
 
 def host_run(args):
     print()
-    return Host(config_file=args.config_file, objectname=args.objectname, host=args.host, timeout=args.timeout)
+    vicon_client = None
+    if args.virtual_create is not None:
+        from math import pi
+        from atlantic_signatures.virtual_create import VirtualCreate, VirtualTracker
+        x0, y0, theta0 = args.virtual_create
+        create = VirtualCreate(x0=x0, y0=y0, theta0=theta0 * pi / 180)  # convert degrees to radians
+        print(f'Virtual Create listening on serial port: {create.port}')
+        print()
+        vicon_client = VirtualTracker(create)
+    if args.asyncio:
+        from atlantic_signatures.host import AsyncHost
+        return AsyncHost(config_file=args.config_file, objectname=args.objectname, host=args.host, timeout=args.timeout,
+                         vicon_client=vicon_client, replay=args.replay, realtime_replay=not args.fast_replay, record=args.record,
+                         flush_interval=args.flush_interval)
+    return Host(config_file=args.config_file, objectname=args.objectname, host=args.host, timeout=args.timeout, binary_data=not args.json_data, streaming=args.stream,
+                vicon_client=vicon_client, replay=args.replay, realtime_replay=not args.fast_replay, record=args.record,
+                flush_interval=args.flush_interval)
 
 
 def client_run(args):
     print()
-    return Client(host=args.host)
+    if args.asyncio:
+        from atlantic_signatures.client import AsyncClient
+        return AsyncClient(host=args.host, serialport=args.serialport)
+    return Client(host=args.host, serialport=args.serialport)
 
 
 def sim_run(args):
     from math import pi
     from atlantic_signatures.simulation import Simulation
     theta0_radians = args.theta0 * pi / 180  # convert degrees to radians
-    sim = Simulation(x0=args.x0, y0=args.y0, theta0=theta0_radians, config_file=args.config_file)
+    sim = Simulation(x0=args.x0, y0=args.y0, theta0=theta0_radians, config_file=args.config_file, flush_interval=args.flush_interval)
+
+
+def sweep_run(args):
+    from math import pi
+    from atlantic_signatures.sweep import Sweep, parse_range
+    options = dict(args.vary or [])
+    theta0_radians = parse_range(args.theta0) * pi / 180  # convert degrees to radians
+    sweep = Sweep(args.config_file, options, x0=parse_range(args.x0), y0=parse_range(args.y0), theta0=theta0_radians,
+                  max_steps=args.max_steps, workers=args.workers, chunk_size=args.chunk_size)
+    print(f'Running {len(sweep)} simulations')
+    results = sweep.run()
+    sweep.save(args.output, results)
+    for outcome in ('finished', 'out_of_bounds', 'max_steps'):
+        print(f'{outcome}: {int((results["outcome"] == outcome).sum())}')
+    print(f'Saved "{args.output}"')
 
 
 def plot_run(args):
@@ -45,46 +78,39 @@ def plot_run(args):
         file = Path(file)
         print(f'Reading "{file}"')
 
-        with (open(file, 'r', buffering=1) as input_file,
-              tempfile.TemporaryFile(mode='w', delete_on_close=False) as config_file,
-              tempfile.TemporaryFile(mode='w', delete_on_close=False) as csv_file):
-
-            # walk through the input file to where the CSV content starts,
-            # copying what comes before into a temporary config file, and what
-            # comes after into a temporary CSV file
-            CSV_HEADER_RE = re.compile(r'([a-zA-Z]+\s\([a-zA-Z]+\)\s*,*\s*)+')
-            csv_header_found = False
-            for line in input_file:
-                if not csv_header_found:
-                    csv_header_found = (CSV_HEADER_RE.match(line) is not None)
-                if not csv_header_found:
-                    config_file.write(line)
-                else:
-                    csv_file.write(line)
-
-            # close the temp files so that they can be read by the plotters
-            config_file.close()
-            csv_file.close()
-
-            if args.plot_type in ['all', 'static']:
-                print(f'Plotting "{file}"')
-                from atlantic_signatures.plotter.plot import Plot
-                fig = Plot(config_file.name, csv_file.name)
-                out_file = str(file.parent / (file.stem + '.png'))
-                fig.save(out_file)
-                print(f'Saved "{out_file}"')
-
-            if args.plot_type in ['all', 'animated']:
-                print(f'Animating "{file}"')
-                from atlantic_signatures.plotter.plot import AnimatedPlot
-                anim = AnimatedPlot(config_file.name, csv_file.name, t_multi=10, n=args.n)
-                out_file = str(file.parent / (file.stem + '.gif'))
-                anim.save(out_file, fps=10)
-                print(f'Saved "{out_file}"')
+        # run files and CSV files embed their config, which the plotters read
+        # along with the data; .npy files need --file
+        if args.plot_type in ['all', 'static']:
+            print(f'Plotting "{file}"')
+            from atlantic_signatures.plotter.plot import Plot
+            fig = Plot(args.config_file, file)
+            out_file = str(file.parent / (file.stem + '.png'))
+            fig.save(out_file)
+            print(f'Saved "{out_file}"')
+
+        if args.plot_type in ['all', 'animated']:
+            print(f'Animating "{file}"')
+            from atlantic_signatures.plotter.plot import AnimatedPlot
+            anim = AnimatedPlot(args.config_file, file, t_multi=10, n=args.n)
+            out_file = str(file.parent / (file.stem + '.gif'))
+            anim.save(out_file, fps=10)
+            print(f'Saved "{out_file}"')
 
         print()
 
 
+def convert_run(args):
+    from atlantic_signatures.run_file import convert_legacy_csv
+
+    files = []
+    for file in args.file:
+        files += glob.glob(file)
+
+    for file in files:
+        print(f'Converting "{file}"')
+        print(f'Saved "{convert_legacy_csv(file)}"')
+
+
 def get_parser():
     main_parser = argparse.ArgumentParser(description='CLI for controlling the Create and generating plots')
     command_subparser = main_parser.add_subparsers(title='commands', required=True)
@@ -116,6 +142,49 @@ def get_parser():
             default=10,
             help="The number of seconds communication can be unresponsive before the program times out and subsequently closes"
         )
+        run_parser.add_argument(
+            '--json-data',
+            action='store_true',
+            help="Send poses to the client as JSON DATA packets instead of fixed-size binary POSE packets (for older clients)"
+        )
+        run_parser.add_argument(
+            '--stream',
+            action='store_true',
+            help="Stream poses to the client at the Vicon frame rate without waiting for per-packet acknowledgements"
+        )
+        run_parser.add_argument(
+            '--asyncio',
+            action='store_true',
+            help="Run Vicon acquisition, pose streaming and client handling as concurrent asyncio tasks (implies --stream)"
+        )
+        run_parser.add_argument(
+            '--record',
+            metavar='FILE',
+            help="Record the Vicon frames read during the experiment to a file, for later replay"
+        )
+        run_parser.add_argument(
+            '--replay',
+            metavar='FILE',
+            help="Replay a recorded Vicon session instead of connecting to the Vicon system"
+        )
+        run_parser.add_argument(
+            '--fast-replay',
+            action='store_true',
+            help="Replay the recorded Vicon frames as fast as possible instead of at their recorded rate"
+        )
+        run_parser.add_argument(
+            '--virtual-create',
+            type=float,
+            nargs=3,
+            metavar=('X0', 'Y0', 'THETA0'),
+            help="Track a virtual Create starting at the given pose (in millimeters and degrees) instead of using the Vicon system. The client connects to it with --serialport"
+        )
+        run_parser.add_argument(
+            '--flush-interval',
+            type=float,
+            default=FLUSH_INTERVAL,
+            help="The number of seconds between writes of the logged poses to the run file (default: %g)" % FLUSH_INTERVAL
+        )
         run_parser.set_defaults(func=host_run)
 
     else:
@@ -131,6 +200,15 @@ def get_parser():
             default=get_host_addr(),
             help='IP address for the host computer'
         )
+        run_parser.add_argument(
+            '--asyncio',
+            action='store_true',
+            help='Handle packets, drive the Create and send heartbeats as concurrent asyncio tasks'
+        )
+        run_parser.add_argument(
+            '--serialport',
+            help='The serial port the Create is connected to (e.g. the port of a virtual Create). Defaults to the first FTDI device found'
+        )
         run_parser.set_defaults(func=client_run)
 
     sim_parser = command_subparser.add_parser('sim', description='Run a simulation of an experiment', help='Run a simulation of an experiment')
@@ -143,8 +221,32 @@ def get_parser():
         default=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'demo.cfg'),
         help='The file containing all test parameters',
     )
+    sim_parser.add_argument('--flush-interval', type=float, default=FLUSH_INTERVAL, help='The number of seconds between writes of the logged poses to the run file (default: %g)' % FLUSH_INTERVAL)
     sim_parser.set_defaults(func=sim_run)
 
+    sweep_parser = command_subparser.add_parser('sweep', description='Run a parameter sweep of simulations in parallel. Place "--" before the starting poses if they begin with a negative number (e.g. sweep --vary lambda 5,10 -- -2000:2000:5 -1500)', help='Run a parameter sweep of simulations in parallel')
+    sweep_parser.add_argument('x0', help='Initial x-coordinates of the simulated robot (in millimeters; comma-separated list or start:stop:num)')
+    sweep_parser.add_argument('y0', help='Initial y-coordinates of the simulated robot (in millimeters; comma-separated list or start:stop:num)')
+    sweep_parser.add_argument('theta0', nargs='?', default='0', help='(Optional) Initial headings of the simulated robot (in degrees; comma-separated list or start:stop:num; default: 0, East)')
+    sweep_parser.add_argument(
+        '--file', '-f',
+        dest='config_file',
+        default=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'demo.cfg'),
+        help='The base file containing all test parameters',
+    )
+    sweep_parser.add_argument(
+        '--vary', '-v',
+        nargs=2,
+        action='append',
+        metavar=('OPTION', 'VALUES'),
+        help="A Field, Current or Create property and the values to sweep it over, as a comma-separated list or start:stop:num, with optional units (e.g. --vary lambda '0:10:6 (degrees)'); may be repeated",
+    )
+    sweep_parser.add_argument('--output', '-o', default='sweep.npz', help='The columnar result file to write (default: sweep.npz)')
+    sweep_parser.add_argument('--workers', '-j', type=int, default=None, help='The number of worker processes (default: one per CPU core)')
+    sweep_parser.add_argument('--chunk-size', type=int, default=64, help='The number of starting poses simulated together by one task (default: 64)')
+    sweep_parser.add_argument('--max-steps', type=int, default=100000, help='The maximum number of steps of each simulation (default: 100000)')
+    sweep_parser.set_defaults(func=sweep_run)
+
     plot_parser = command_subparser.add_parser('plot', description='Generate plots of an experiment', help='Generate plots of an experiment')
     plot_parser.add_argument('file', nargs='+', help='The input file to plot, created by an experiment (multiple files and/or wildcards allowed)')
     plot_parser.add_argument(
@@ -155,8 +257,13 @@ def get_parser():
         help='The type of plot to generate (default: all)',
     )
     plot_parser.add_argument('--n', '-n', type=int, nargs='?', default=5, help='Animate every n-th data point (default: 5)')
+    plot_parser.add_argument('--file', '-f', dest='config_file', help='The config file of the experiment, overriding the one embedded in the input file (required for .npy files of x, y, theta and time)')
     plot_parser.set_defaults(func=plot_run)
 
+    convert_parser = command_subparser.add_parser('convert', description='Convert CSV files of experiments to run files', help='Convert CSV files of experiments to run files')
+    convert_parser.add_argument('file', nargs='+', help='The CSV file to convert, created by an experiment (multiple files and/or wildcards allowed)')
+    convert_parser.set_defaults(func=convert_run)
+
     return main_parser
 
 
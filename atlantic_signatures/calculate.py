@@ -4,11 +4,20 @@ calculating the ocean current velocity and the magnetic field, and some helper
 functions.
 """
 
+from collections import OrderedDict
 from operator import itemgetter
 
 import numpy as np
 
 
+# Number of circuits whose affine field coefficients are cached by each Field
+COEFFICIENT_CACHE_SIZE = 128
+
+# Smallest sine of the angle between the level sets of the inclination/beta and
+# intensity/gamma planes for which magnetic signatures are invertible
+SINGULAR_TOLERANCE = 1e-9
+
+
 def normalize(v):
     """Return the normalized form of the vector v, safely handling the zero vector."""
 
@@ -17,6 +26,18 @@ def normalize(v):
         return v
     return v / norm
 
+def normalize_xy(x, y):
+    """Return the normalized components of the vectors (x, y), element-wise.
+
+    This is the array counterpart of :func:`normalize` for vectors stored as
+    separate x- and y-component arrays. Zero vectors are left unchanged.
+    """
+
+    x, y = np.asarray(x, dtype=float), np.asarray(y, dtype=float)
+    norm = np.hypot(x, y)
+    norm = np.where(norm == 0, 1, norm)
+    return x / norm, y / norm
+
 def remove_units(quantity):
     """Return the (unitless) magnitude a Quantity object, safely handling non-Quantity numbers."""
 
@@ -28,10 +49,12 @@ class Current:
 
     To represent the North Atlantic Gyre, this model implements an
     elliptical-shaped ocean current. The ocean current velocity vector, defined
-    at each point in space (except the origin) and originally given in polar
-    coordinates (v_radial, v_theta), is transformed into Cartesian coordinates,
-    scaled in the x- and y-dimensions by the factors s_x and s_y, and then is
-    rotated by an angle theta_fluid.
+    at each point in space (except the current source position) and originally
+    given in polar coordinates (v_radial, v_theta) about the current source
+    position, is transformed into Cartesian coordinates, scaled in the x- and
+    y-dimensions by the factors s_x and s_y, and then is rotated by an angle
+    theta_fluid. Since these are all linear, they are combined into a single
+    2x2 matrix when the Current is created.
 
     Parameters:
         s_x : float
@@ -45,13 +68,18 @@ class Current:
             The angle of rotation, applied after scaling
         v_radial : float
             The radial component of velocity, before scaling and rotation
-            (positive is outward from the origin)
+            (positive is outward from the current source position)
+
+    Optional keyword parameters:
+        current_source_position : list of two floats
+            The center of the current (default: [0, 0])
     """
 
     SECTION = 'Current Properties'
     PARAMS = ('s_x', 's_y', 'v_theta', 'theta_fluid', 'v_radial')
+    OPT_PARAMS = dict(current_source_position=[0, 0])
 
-    def __init__(self, s_x, s_y, v_theta, theta_fluid, v_radial=0):
+    def __init__(self, s_x, s_y, v_theta, theta_fluid, v_radial=0, current_source_position=OPT_PARAMS['current_source_position']):
         """Initializer for a new Current."""
 
         self._s_x = s_x
@@ -59,6 +87,16 @@ class Current:
         self._v_theta = v_theta
         self._theta_fluid = theta_fluid
         self._v_radial = v_radial
+        self._x_source, self._y_source = (float(remove_units(i)) for i in current_source_position)
+
+        # rotation by theta_fluid @ scaling by (s_x, s_y) @ polar to Cartesian
+        # velocity, applied to the unit vector from the current source position
+        cos_t, sin_t = np.cos(theta_fluid), np.sin(theta_fluid)
+        rotation = np.array([[cos_t, -sin_t], [sin_t, cos_t]])
+        scaling = np.diag([s_x, s_y])
+        polar = np.array([[v_radial, -v_theta], [v_theta, v_radial]])
+        self._matrix = remove_units(rotation @ scaling @ polar)
+        (self._m_xx, self._m_xy), (self._m_yx, self._m_yy) = self._matrix.tolist()
 
     def calculate(self, x, y):
         """Calculate ocean current velocity vectors.
@@ -76,16 +114,12 @@ class Current:
                 The y-component(s) of the velocity at each point
         """
 
+        if self._x_source or self._y_source:
+            x, y = x - self._x_source, y - self._y_source
         r = np.hypot(x, y) + 1e-4
 
-        a = (self._s_x/r)*(self._v_radial*x - self._v_theta*y)
-        b = (self._s_y/r)*(self._v_radial*y + self._v_theta*x)
-
-        v_x = a*np.cos(self._theta_fluid) - b*np.sin(self._theta_fluid)
-        v_y = a*np.sin(self._theta_fluid) + b*np.cos(self._theta_fluid)
-
-        v_x = remove_units(v_x)
-        v_y = remove_units(v_y)
+        v_x = (self._m_xx*x + self._m_xy*y) / r
+        v_y = (self._m_yx*x + self._m_yy*y) / r
 
         return v_x, v_y
 
@@ -103,7 +137,11 @@ class Current:
         """
 
         values = itemgetter(*cls.PARAMS)(cache[cls.SECTION])
-        return cls(**dict(zip(cls.PARAMS, values)))
+
+        kwargs = {i: j for i, j in cache[cls.SECTION].items() if i in cls.OPT_PARAMS}
+        kwargs.update(zip(cls.PARAMS, values))
+
+        return cls(**kwargs)
 
 
 
@@ -254,6 +292,9 @@ class Field:
         self._delta_theta_inc = kwargs.get('delta_theta_inc', self.OPT_PARAMS['delta_theta_inc'])
         self._delta_theta_int = kwargs.get('delta_theta_int', self.OPT_PARAMS['delta_theta_int'])
 
+        self._coefficient_cache = OrderedDict()
+        self._inverse_cache = OrderedDict()
+
     def calculate(self, x, y, n):
         """Calculate magnetic signatures.
 
@@ -262,9 +303,10 @@ class Field:
                 The x-coordinate(s) of a point or array of points
             y : float or array_like
                 The y-coordinate(s) of a point or array of points
-            n : int
-                The circuit/migration number (0 corresponds to the first
-                circuit)
+            n : int or array_like
+                The circuit/migration number(s) (0 corresponds to the first
+                circuit), broadcast against the other arguments (see
+                :meth:`calculate_circuits` for one output per circuit)
 
         Returns:
             beta : float or array_like
@@ -275,28 +317,186 @@ class Field:
                 point
         """
 
+        a_bx, a_by, a_gx, a_gy, b_b, b_g = self._gather(self._coefficients, n)
+        if np.ndim(n) != 0:
+            x, y = np.asarray(x), np.asarray(y)
+
+        beta = a_bx*x + a_by*y + b_b
+        gamma = a_gx*x + a_gy*y + b_g
+
+        return beta, gamma
+
+    def calculate_circuits(self, x, y, n):
+        """Calculate magnetic signatures over several circuits at once.
+
+        Arguments:
+            x : float or array_like
+                The x-coordinate(s) of a point or array of points
+            y : float or array_like
+                The y-coordinate(s) of a point or array of points
+            n : array_like
+                A 1D array of circuit/migration numbers (0 corresponds to the
+                first circuit)
+
+        Returns:
+            beta : ndarray
+                The inclination/beta value(s) of the magnetic signature at each
+                point in each circuit, of shape (len(n), ...)
+            gamma : ndarray
+                The intensity/gamma value(s) of the magnetic signature at each
+                point in each circuit, of shape (len(n), ...)
+        """
+
+        return self.calculate(x, y, n=self._circuit_axis(n, x, y))
+
+    def inverse_circuits(self, beta, gamma, n):
+        """Find locations of magnetic signatures over several circuits at once.
+
+        This gives, in one call, the drift path of magnetic signatures due to
+        secular variation.
+
+        Arguments:
+            beta : float or array_like
+                The inclination/beta value(s) of a magnetic signature or array
+                of magnetic signatures
+            gamma : float or array_like
+                The intensity/gamma value(s) of a magnetic signature or array of
+                magnetic signatures
+            n : array_like
+                A 1D array of circuit/migration numbers (0 corresponds to the
+                first circuit)
+
+        Returns:
+            x : ndarray
+                The x-coordinate(s) of the point(s) corresponding to each
+                magnetic signature in each circuit, of shape (len(n), ...)
+            y : ndarray
+                The y-coordinate(s) of the point(s) corresponding to each
+                magnetic signature in each circuit, of shape (len(n), ...)
+        """
+
+        return self.inverse(beta, gamma, n=self._circuit_axis(n, beta, gamma))
+
+    @staticmethod
+    def _circuit_axis(n, *args):
+        """
+        Reshape the 1D array of circuit numbers *n* to broadcast along a new
+        leading axis of *args*.
+        """
+
+        n = np.asarray(n)
+        if n.ndim != 1:
+            raise ValueError(f'expected a 1D array of circuit numbers, got shape: {n.shape}')
+        return n.reshape(-1, *[1] * np.ndim(np.broadcast(*args)))
+
+    def affine(self, n):
+        """Return the affine map of the magnetic field of a circuit.
+
+        The magnetic field being linearized, [beta, gamma] = A @ [x, y] + b.
+
+        Arguments:
+            n : int
+                The circuit/migration number (0 corresponds to the first
+                circuit)
+
+        Returns:
+            A : ndarray
+                The 2x2 linear part of the map
+            b : ndarray
+                The offset of the map
+        """
+
+        a_bx, a_by, a_gx, a_gy, b_b, b_g = self._coefficients(n)
+        return np.array([[a_bx, a_by], [a_gx, a_gy]]), np.array([b_b, b_g])
+
+    def _coefficients(self, n):
+        """
+        Return the affine coefficients of circuit *n* (see :meth:`affine`),
+        flattened, from the cache of the most recently used circuits.
+        """
+
+        return self._cached(self._coefficient_cache, n, self._compute_coefficients)
+
+    def _compute_coefficients(self, n):
+        # each plane is (e/c)*(d - a*(X*cos(t) + Y*sin(t)) - b*(Y*cos(t) - X*sin(t)))
+        # with X = x + dx*n, Y = y + dy*n and t = theta + dtheta*n
+        def _plane(a, b, c, d, e, t, dx, dy, dt):
+            cos_t, sin_t = np.cos(t + dt*n), np.sin(t + dt*n)
+            k_x = -(e/c)*(a*cos_t - b*sin_t)
+            k_y = -(e/c)*(a*sin_t + b*cos_t)
+            return k_x, k_y, (e/c)*d + (k_x*dx + k_y*dy)*n
+
         d_beta  = sum(i*j for i, j in zip(self._beta_0, (self._a_inc, self._b_inc, self._c_inc)))
         d_gamma = sum(i*j for i, j in zip(self._gamma_0, (self._a_int, self._b_int, self._c_int)))
 
-        def _func(a, b, c, d, e, t, dx, dy, dt):
-            return (e/c)*(d - a*((x+dx*n)*np.cos(t+dt*n) + (y+dy*n)*np.sin(t+dt*n)) - b*((y+dy*n)*np.cos(t+dt*n) - (x+dx*n)*np.sin(t+dt*n)))
+        a_bx, a_by, b_b = _plane(self._a_inc, self._b_inc, self._c_inc, d_beta, self._eta, self._theta_inc, self._delta_x_inc, self._delta_y_inc, self._delta_theta_inc)
+        a_gx, a_gy, b_g = _plane(self._a_int, self._b_int, self._c_int, d_gamma, 1, self._theta_int, self._delta_x_int, self._delta_y_int, self._delta_theta_int)  # gamma's eta is always 1 -- negated sensing affects beta only
 
-        beta = _func(self._a_inc, self._b_inc, self._c_inc, d_beta, self._eta, self._theta_inc, self._delta_x_inc, self._delta_y_inc, self._delta_theta_inc)
-        gamma = _func(self._a_int, self._b_int, self._c_int, d_gamma, 1, self._theta_int, self._delta_x_int, self._delta_y_int, self._delta_theta_int)  # gamma's eta is always 1 -- negated sensing affects beta only
+        return tuple(float(remove_units(i)) for i in (a_bx, a_by, a_gx, a_gy, b_b, b_g))
 
-        beta = remove_units(beta)
-        gamma = remove_units(gamma)
+    def _inverse_coefficients(self, n):
+        """
+        Return the coefficients of the inverse of the affine map of circuit
+        *n*, flattened like those of :meth:`_coefficients`, from the cache of
+        the most recently used circuits.
+        """
 
-        return beta, gamma
+        return self._cached(self._inverse_cache, n, self._compute_inverse_coefficients)
+
+    def _compute_inverse_coefficients(self, n):
+        a_bx, a_by, a_gx, a_gy, b_b, b_g = self._coefficients(n)
+
+        # the determinant, relative to the gradients of the two planes, is the
+        # sine of the angle between their level sets
+        det = a_bx*a_gy - a_by*a_gx
+        if abs(det) <= SINGULAR_TOLERANCE * np.hypot(a_bx, a_by) * np.hypot(a_gx, a_gy):
+            raise ValueError(f'the inclination/beta and intensity/gamma planes of circuit {n} are parallel, '
+                             'so magnetic signatures do not determine unique locations')
+
+        i_xb, i_xg = a_gy/det, -a_by/det
+        i_yb, i_yg = -a_gx/det, a_bx/det
+        return i_xb, i_xg, i_yb, i_yg, -(i_xb*b_b + i_xg*b_g), -(i_yb*b_b + i_yg*b_g)
+
+    @staticmethod
+    def _cached(cache, n, compute):
+        """
+        Return *compute(n)*, memoized in the least-recently-used *cache* of
+        the last COEFFICIENT_CACHE_SIZE circuits.
+        """
+
+        try:
+            cache.move_to_end(n)
+            return cache[n]
+        except KeyError:
+            pass
+
+        value = cache[n] = compute(n)
+        if len(cache) > COEFFICIENT_CACHE_SIZE:
+            cache.popitem(last=False)
+        return value
+
+    @staticmethod
+    def _gather(coefficients, n):
+        """
+        Return the coefficients of the circuit(s) *n*, either as floats or,
+        for an array of circuit numbers, as arrays of each point's
+        coefficients.
+        """
+
+        if np.ndim(n) == 0:
+            return coefficients(n)
+
+        levels, index = np.unique(n, return_inverse=True)
+        gathered = np.array([coefficients(level) for level in levels])[index.reshape(np.shape(n))]
+        return np.moveaxis(gathered, -1, 0)
 
     def inverse(self, beta, gamma, n):
         """Find locations of magnetic signatures.
 
-        Because the linearized magnetic field can be solved analytically,
-        closed-form exact solutions can be calculated here (Mathematica was used
-        to produce this code). In the general case of an arbitrary magnetic
-        field, numerical techniques will likely be needed (e.g.,
-        scipy.optimize.fsolve).
+        Because the linearized magnetic field is an affine map, exact
+        solutions are calculated here by inverting it (see :meth:`affine`). In
+        the general case of an arbitrary magnetic field, numerical techniques
+        will likely be needed (e.g., scipy.optimize.fsolve).
 
         Arguments:
             beta : float or array_like
@@ -305,9 +505,10 @@ class Field:
             gamma : float or array_like
                 The intensity/gamma value(s) of a magnetic signature or array of
                 magnetic signatures
-            n : int
-                The circuit/migration number (0 corresponds to the first
-                circuit)
+            n : int or array_like
+                The circuit/migration number(s) (0 corresponds to the first
+                circuit), broadcast against the other arguments (see
+                :meth:`inverse_circuits` for one output per circuit)
 
         Returns:
             x : float or array_like
@@ -316,72 +517,19 @@ class Field:
             y : float or array_like
                 The y-coordinate(s) of the point(s) corresponding to each
                 magnetic signature
+
+        Raises:
+            ValueError
+                If the level sets of the two planes are parallel (within
+                SINGULAR_TOLERANCE), so that locations are not unique
         """
 
-        x = (self._a_inc * (self._a_int * self._gamma_0[0] + self._b_int * self._gamma_0[1] - self._c_int * gamma) * self._eta * np.sin(
-                n * self._delta_theta_inc + self._theta_inc) +
-            np.cos(n * self._delta_theta_int +
-            self._theta_int) * (self._b_int * self._c_inc * beta -
-                self._b_int * (self._a_inc * self._beta_0[0] + self._b_inc * self._beta_0[1]) * self._eta -
-                n * (self._b_inc * self._b_int * self._delta_x_inc +
-                    self._a_inc * self._a_int * self._delta_x_int +
-                    self._a_inc * self._b_int * (-self._delta_y_inc + self._delta_y_int
-            )) * self._eta * np.sin(
-                    n * self._delta_theta_inc + self._theta_inc)) + (self._a_int * self._c_inc *
-            beta - self._a_int * (self._a_inc * self._beta_0[0] + self._b_inc * self._beta_0[1]) * self._eta +
-                n * (self._a_inc * self._b_int * self._delta_x_int -
-                    self._a_int * (self._b_inc * self._delta_x_inc - self._a_inc * self._delta_y_inc +
-                        self._a_inc * self._delta_y_int)) * self._eta * np.sin(
-                    n * self._delta_theta_inc + self._theta_inc)) * np.sin(
-                n * self._delta_theta_int + self._theta_int) + self._eta * np.cos(
-                n * self._delta_theta_inc + self._theta_inc) * (self._b_inc * (self._a_int * self._gamma_0[0] +
-                    self._b_int * self._gamma_0[1] - self._c_int * gamma) +
-                n * (self._a_inc * self._b_int * self._delta_x_inc -
-                    self._b_inc * (self._a_int * self._delta_x_int +
-                        self._b_int * (-self._delta_y_inc + self._delta_y_int))) * np.cos(
-                    n * self._delta_theta_int + self._theta_int) +
-                n * (self._a_inc * self._a_int * self._delta_x_inc +
-                    self._b_inc * self._b_int * self._delta_x_int +
-                    self._a_int * self._b_inc * (self._delta_y_inc - self._delta_y_int)) * np.sin(
-                    n * self._delta_theta_int + self._theta_int))) / ((self._a_int * self._b_inc -
-                self._a_inc * self._b_int) * self._eta * np.cos(
-                n * (self._delta_theta_inc - self._delta_theta_int) +
-            self._theta_inc - self._theta_int) + (self._a_inc * self._a_int + self._b_inc * self._b_int) * self._eta * np.sin(
-                n * (self._delta_theta_inc - self._delta_theta_int) +
-            self._theta_inc - self._theta_int))
-
-        y = (self._b_inc * (self._a_int * self._gamma_0[0] + self._b_int * self._gamma_0[1] - self._c_int * gamma) * self._eta * np.sin(
-                n * self._delta_theta_inc + self._theta_inc) +
-            np.cos(n * self._delta_theta_int + self._theta_int) * (self._a_int * (-self._c_inc *
-            beta + self._a_inc * self._beta_0[0] * self._eta + self._b_inc * self._beta_0[1] * self._eta) +
-                n * (self._a_int * self._b_inc * (self._delta_x_inc - self._delta_x_int) -
-                    self._a_inc * self._a_int * self._delta_y_inc -
-                    self._b_inc * self._b_int * self._delta_y_int) * self._eta * np.sin(
-                    n * self._delta_theta_inc + self._theta_inc)) + (self._b_int * self._c_inc *
-            beta - self._b_int * (self._a_inc * self._beta_0[0] + self._b_inc * self._beta_0[1]) * self._eta +
-                n * (self._a_inc * self._b_int * self._delta_y_inc -
-                    self._b_inc * (self._b_int * self._delta_x_inc - self._b_int * self._delta_x_int +
-                        self._a_int * self._delta_y_int)) * self._eta * np.sin(
-                    n * self._delta_theta_inc + self._theta_inc)) * np.sin(
-                n * self._delta_theta_int + self._theta_int) + self._eta * np.cos(
-                n * self._delta_theta_inc + self._theta_inc) * (-self._a_inc * (self._a_int * self._gamma_0[0] +
-                    self._b_int * self._gamma_0[1] - self._c_int * gamma) +
-                n * (self._a_inc * self._a_int * (-self._delta_x_inc + self._delta_x_int) -
-                    self._a_int * self._b_inc * self._delta_y_inc +
-                    self._a_inc * self._b_int * self._delta_y_int) * np.cos(
-                    n * self._delta_theta_int + self._theta_int) +
-                n * (self._a_inc * self._b_int * (self._delta_x_inc - self._delta_x_int) +
-                    self._b_inc * self._b_int * self._delta_y_inc +
-                    self._a_inc * self._a_int * self._delta_y_int) * np.sin(
-                    n * self._delta_theta_int + self._theta_int))) / ((self._a_int * self._b_inc -
-                self._a_inc * self._b_int) * self._eta * np.cos(
-                n * (self._delta_theta_inc - self._delta_theta_int) +
-            self._theta_inc - self._theta_int) + (self._a_inc * self._a_int + self._b_inc * self._b_int) * self._eta * np.sin(
-                n * (self._delta_theta_inc - self._delta_theta_int) +
-            self._theta_inc - self._theta_int))
-
-        x = remove_units(x)
-        y = remove_units(y)
+        i_xb, i_xg, i_yb, i_yg, c_x, c_y = self._gather(self._inverse_coefficients, n)
+        if np.ndim(n) != 0:
+            beta, gamma = np.asarray(beta), np.asarray(gamma)
+
+        x = i_xb*beta + i_xg*gamma + c_x
+        y = i_yb*beta + i_yg*gamma + c_y
 
         return x, y
 
@@ -404,3 +552,128 @@ class Field:
         kwargs.update({i: j for i, j in zip(cls.REQ_PARAMS, values)})
 
         return cls(**kwargs)
+
+
+
+class Noise:
+    """A class for adding measurement noise to magnetic signatures.
+
+    Normally distributed noise, with independent means and standard deviations
+    for inclination/beta and intensity/gamma, is added to the magnetic
+    signatures sensed by the agent. Standard normal variates are drawn from a
+    :class:`numpy.random.Generator` in pre-sized blocks, rather than on every
+    call, so that per-step sensing of a single agent stays cheap. Noise that is
+    zero (both means and standard deviations are 0) draws nothing and leaves
+    magnetic signatures unchanged.
+
+    Parameters:
+        mean_beta_noise : float
+            The mean of the noise added to inclination/beta
+        mean_gamma_noise : float
+            The mean of the noise added to intensity/gamma
+        std_dev_beta_noise : float
+            The standard deviation of the noise added to inclination/beta
+        std_dev_gamma_noise : float
+            The standard deviation of the noise added to intensity/gamma
+
+    Optional keyword parameters:
+        noise_seed : int
+            The seed of the random number generator, for reproducible runs
+            (default: None, unpredictable)
+        noise_block_size : int
+            The number of variates drawn at once (default: 4096)
+        rng : numpy.random.Generator
+            The random number generator to draw from, overriding noise_seed
+    """
+
+    SECTION = 'Noise Properties'
+    PARAMS = ('mean_beta_noise', 'mean_gamma_noise', 'std_dev_beta_noise', 'std_dev_gamma_noise')
+    OPT_PARAMS = dict(noise_seed=None, noise_block_size=4096)
+
+    def __init__(self, mean_beta_noise=0.0, mean_gamma_noise=0.0, std_dev_beta_noise=0.0, std_dev_gamma_noise=0.0,
+                 noise_seed=OPT_PARAMS['noise_seed'], noise_block_size=OPT_PARAMS['noise_block_size'], rng=None):
+        """Initializer for a new Noise."""
+
+        self._mean_beta = mean_beta_noise
+        self._mean_gamma = mean_gamma_noise
+        self._std_dev_beta = std_dev_beta_noise
+        self._std_dev_gamma = std_dev_gamma_noise
+
+        self._rng = np.random.default_rng(noise_seed) if rng is None else rng
+        self._block_size = noise_block_size
+        self._block = np.empty(0)
+        self._block_list = []  # the same block, for fast scalar indexing
+        self._used = 0
+
+    @property
+    def enabled(self):
+        """Whether any noise is added to magnetic signatures."""
+
+        return any((self._mean_beta, self._mean_gamma, self._std_dev_beta, self._std_dev_gamma))
+
+    def _reserve(self, size):
+        """
+        Reserve *size* standard normal variates in the current block, drawing
+        a new block if needed, and return the index of the first one.
+        """
+
+        if self._used + size > len(self._block):
+            self._block = self._rng.standard_normal(self._block_size)
+            self._block_list = self._block.tolist()
+            self._used = 0
+
+        start = self._used
+        self._used += size
+        return start
+
+    def apply(self, beta, gamma):
+        """Add noise to magnetic signatures.
+
+        Arguments:
+            beta : float or array_like
+                The inclination/beta value(s) of a magnetic signature or array
+                of magnetic signatures
+            gamma : float or array_like
+                The intensity/gamma value(s) of a magnetic signature or array of
+                magnetic signatures
+
+        Returns:
+            beta : float or array_like
+                The noisy inclination/beta value(s)
+            gamma : float or array_like
+                The noisy intensity/gamma value(s)
+        """
+
+        if isinstance(beta, (float, int)) and isinstance(gamma, (float, int)):  # much faster than np.ndim
+            i = self._reserve(2)
+            z_beta, z_gamma = self._block_list[i], self._block_list[i + 1]
+        else:
+            beta, gamma = np.broadcast_arrays(beta, gamma)
+            size = 2 * beta.size
+            if size > self._block_size:
+                z = self._rng.standard_normal(size)
+            else:
+                i = self._reserve(size)
+                z = self._block[i:i + size]
+            z_beta, z_gamma = z.reshape(2, *beta.shape)
+
+        return (beta + self._mean_beta + self._std_dev_beta * z_beta,
+                gamma + self._mean_gamma + self._std_dev_gamma * z_gamma)
+
+    @classmethod
+    def from_cache(cls, cache, rng=None):
+        """Instantiate a new Noise from a config dictionary.
+
+        Without a Noise Properties section, the Noise is zero.
+
+        Example usage:
+            >>> import importlib.resources
+            >>> config_file = importlib.resources.files('atlantic_signatures').joinpath('demo.cfg')
+            >>>
+            >>> from atlantic_signatures.calculate import Noise
+            >>> from atlantic_signatures.config_loader import Loader, config_to_dict
+            >>> noise = Noise.from_cache(config_to_dict(Loader().read_config_file(config_file)))
+        """
+
+        kwargs = {i: j for i, j in cache.get(cls.SECTION, {}).items() if i in cls.PARAMS + tuple(cls.OPT_PARAMS)}
+        return cls(**kwargs, rng=rng)
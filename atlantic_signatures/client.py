@@ -5,6 +5,7 @@ Raspberry Pi controlling the iRobot Create2.
 
 from __future__ import absolute_import
 
+import asyncio
 import json
 from math import acos, atan2, copysign, cos, sin, sqrt
 import socket
@@ -12,10 +13,17 @@ import time
 import numpy as np
 
 from atlantic_signatures.create import Create, OPCODES
+from atlantic_signatures.lookup_table import LookupTable
 from atlantic_signatures.navigator import Navigator, FinalGoalReached
+from atlantic_signatures.prediction import PosePredictor
 from atlantic_signatures.socket_protocol import *
 
 
+# Default number of seconds the pose may be dead-reckoned from wheel odometry
+# without a pose from the host, before the Create is stopped
+MAX_DEAD_RECKONING = 1.0
+
+
 class Client(Protocol):
     """
     TODO
@@ -25,11 +33,17 @@ class Client(Protocol):
         """Initializer for a new Client."""
 
         self._pose = {'x': None, 'y': None, 'theta': None}
+        self._frame_number = None
+        self._host_timestamp = None
         self._host = host
         self._starting_mode = kwargs.get('starting_mode', 'full')
         self._default_v = 100
         self._started = False
+        self._streaming = False
+        self._last_heartbeat = 0.0
         self._config = {}
+        self._odometry_period = None
+        self._predictor = None
 
         raise_err = False
         for port in (PORT, ALT_PORT):
@@ -65,8 +79,7 @@ class Client(Protocol):
         """
 
         try:
-            while True:
-                self.read_loop()
+            self.run_loop()
         except BreakLoop:
             pass
         except TimeoutError:
@@ -80,6 +93,13 @@ class Client(Protocol):
             else:
                 raise
         finally:
+            if self._predictor is not None and self._predictor.latency_count:
+                print(
+                    'End-to-end pose latency: {:.1f} ms mean, {:.1f} ms max over {} poses '
+                    '({} frames skipped)'.format(1000 * self._predictor.mean_latency, 1000 * self._predictor.max_latency,
+                                                 self._predictor.latency_count, self._predictor.dropped_frames)
+                    )
+
             # always cleanly close the socket
             self._client_sock.close()
             print('Client socket has been closed')
@@ -88,21 +108,61 @@ class Client(Protocol):
             self._create.close()
             print('Serial connection has been closed')
 
+    def run_loop(self):
+        """
+        Handle packets from the host until the connection is closed.
+        """
+
+        while True:
+            self.read_loop()
+
     def read_loop(self):
         """
         TODO
         """
 
+        if self._odometry_period is not None and not self._pending(self._odometry_period):
+            # no pose arrived within the control period
+            if self.dead_reckon():
+                self.move_to_next_point(**self._pose)
+            return
+
         pb, payload = self._recv()
 
+        if self._streaming and pb == PACKETS.POSE:
+            # act on the newest pose only, dropping any stale ones that queued
+            # up while the Create was moving; payloads are views into the
+            # reader's buffer, overwritten by the next read, so the pose is
+            # copied before reading on
+            payload = bytes(payload)
+            while self._pending():
+                next_pb, next_payload = self._recv()
+                if next_pb == PACKETS.POSE:
+                    payload = bytes(next_payload)
+                else:
+                    self.dispatch(next_pb, next_payload)
+
+        self.dispatch(pb, payload)
+
+    def dispatch(self, pb, payload):
+        """
+        Handle a received packet according to its packet byte.
+        """
+
         if pb == PACKETS.COMMAND:
             self.recv_command(payload)
         elif pb == PACKETS.CONFIG:
             self.recv_config(payload)
         elif pb == PACKETS.DATA:
             self.recv_data(payload)
+        elif pb == PACKETS.POSE:
+            self.recv_pose(payload)
         elif pb == PACKETS.START:
             self.recv_start(payload)
+        elif pb == PACKETS.STREAM:
+            self.recv_stream(payload)
+        elif pb == PACKETS.TABLE:
+            self.recv_table(payload)
         elif pb == PACKETS.CLOSE:
             self.recv_close(payload)
         else:
@@ -113,11 +173,11 @@ class Client(Protocol):
         TODO
         """
 
-        command = json.loads(payload, encoding='utf-8')
+        command = json.loads(bytes(payload))
         if command['opcode'] == OPCODES.DRIVE:
-            self._create._drive(v=command.get('v', self._default_v), r=command.get('r', 'straight'))
+            self.drive(v=command.get('v', self._default_v), r=command.get('r', 'straight'))
         elif command['opcode'] == OPCODES.DRIVE_DIRECT:
-            self._create._drive_direct(vl=command.get('vl', self._default_v), vr=command.get('vr', self._default_v))
+            self.drive_direct(vl=command.get('vl', self._default_v), vr=command.get('vr', self._default_v))
         self._client_sock.send(bytes(PACKETS.ACKCOMMAND))
 
     def recv_config(self, payload):
@@ -125,8 +185,17 @@ class Client(Protocol):
         TODO
         """
 
+        self.load_config(payload)
+        self._client_sock.send(bytes(PACKETS.ACKCONFIG))
+
+    def load_config(self, payload):
+        """
+        Decode the configuration parameters sent by the host and set up the
+        Navigator from them.
+        """
+
         if not self._config:
-            self._config = json.loads(payload)
+            self._config = json.loads(bytes(payload))
 
         print('Configuration parameters were received:')
         for section, params in self._config.items():
@@ -135,14 +204,39 @@ class Client(Protocol):
                 #setattr(self, '_%s' % option, value)
         print()
 
-        self._client_sock.send(bytes(PACKETS.ACKCONFIG))
-
         # Save some important parameters as attributes
         self._time_step = self._config['Create Properties']['agent_time_step']
         self._angle_cutoff = self._config['Create Properties']['angle_cutoff']
+        self._odometry_period = self._config['Create Properties'].get('odometry_control_period')
+        self._predictor = PosePredictor(self._config['Create Properties'].get('prediction_horizon', 0.0), Create._SHAFT_LENGTH)
+        self._max_dead_reckoning = self._config['Create Properties'].get('max_dead_reckoning', MAX_DEAD_RECKONING)
+        if self._odometry_period is not None:
+            # stream the wheel encoder counts, to dead-reckon between poses
+            self._create._stream()
 
         self._navigator = Navigator.from_cache(self._config)
 
+    def recv_table(self, payload):
+        """
+        Hand the navigation lookup table precomputed by the host to the
+        Navigator.
+        """
+
+        self.load_table(payload)
+        self._client_sock.send(bytes(PACKETS.ACKTABLE))
+
+    def load_table(self, payload):
+        """
+        Decode a navigation lookup table and have the Navigator interpolate it
+        outside r_multi.
+        """
+
+        table = LookupTable.from_bytes(bytes(payload))
+        ny, nx = table.shape
+        print(f'A {nx} x {ny} navigation lookup table was received')
+        print()
+        self._navigator.lookup_table = table
+
     def recv_data(self, payload, *, rotating=False):
         """
         Data sent to the Create comes in a JSON encoded dictionary object where
@@ -157,13 +251,105 @@ class Client(Protocol):
         global X-axis.
         """
 
-        data = json.loads(payload)
+        data = json.loads(bytes(payload))
         print("x: {x:+8.02f},    y: {y:+8.02f},    theta: {theta:+5.02f}".format(**data))
         self._pose.update(data)
+        self.anchor_odometry()
         self._client_sock.send(bytes(PACKETS.ACKDATA))
         if not rotating:
             self.move_to_next_point(**self._pose)
 
+    def recv_pose(self, payload, *, rotating=False):
+        """
+        Binary counterpart of :meth:`recv_data`. The payload is a fixed-size
+        packet (see :data:`POSE_STRUCT <atlantic_signatures.socket_protocol.POSE_STRUCT>`)
+        holding x, y, theta, the Vicon frame number and the host timestamp.
+        """
+
+        x, y, theta, frame_number, host_timestamp = unpack_pose(payload)
+        if self._streaming and self._frame_number is not None and frame_number <= self._frame_number:
+            return  # out-of-date pose
+        self._frame_number, self._host_timestamp = frame_number, host_timestamp
+        x, y, theta = self.compensate_latency(x, y, theta)
+
+        print(f"x: {x:+8.02f},    y: {y:+8.02f},    theta: {theta:+5.02f}")
+        self._pose.update(x=x, y=y, theta=theta)
+        self.anchor_odometry()
+        if self._streaming:
+            self.send_heartbeat()
+        else:
+            self._client_sock.send(bytes(PACKETS.ACKPOSE))
+        if not rotating:
+            self.move_to_next_point(**self._pose)
+
+    def recv_stream(self, payload):
+        """
+        Switch to streaming mode, in which poses are no longer acknowledged
+        individually. Liveness is reported to the host by periodic heartbeats
+        instead.
+        """
+
+        self._streaming = True
+        self._client_sock.send(bytes(PACKETS.ACKSTREAM))
+        self.send_heartbeat(force=True)
+
+    def send_heartbeat(self, *, force=False):
+        """
+        Send a heartbeat carrying the frame number of the latest pose, at most
+        once every HEARTBEAT_INTERVAL seconds unless *force* is True.
+        """
+
+        now = time.time()
+        if force or now - self._last_heartbeat >= HEARTBEAT_INTERVAL:
+            frame_number = 0 if self._frame_number is None else self._frame_number
+            self._send(PACKETS.HEARTBEAT, HEARTBEAT_STRUCT.pack(frame_number), ack=False)
+            self._last_heartbeat = now
+
+    def compensate_latency(self, x, y, theta):
+        """
+        Measure the latency of the latest pose from the host, and extrapolate
+        it to the current time along the commanded motion, by at most
+        prediction_horizon seconds.
+        """
+
+        if self._predictor is None:
+            return x, y, theta
+        now = time.time()
+        self._predictor.measure(self._frame_number, self._host_timestamp, now)
+        return self._predictor.predict(x, y, theta, self._host_timestamp, now)
+
+    def anchor_odometry(self):
+        """
+        Anchor the Create's wheel odometry to the pose received from the host.
+        """
+
+        if self._create.odometry is not None:
+            self._create.odometry.reset(self._pose['x'], self._pose['y'], self._pose['theta'])
+
+    def dead_reckon(self):
+        """
+        Update the pose from the Create's wheel odometry, between poses from
+        the host, returning True if it was updated.
+
+        Once no pose was received for max_dead_reckoning seconds, the
+        odometry is no longer trusted and the Create is stopped.
+        """
+
+        odometry = self._create.odometry
+        if odometry is None or odometry.pose is None:
+            return False
+        if odometry.age > self._max_dead_reckoning:
+            if self._create.is_driving:
+                print('No pose was received from the host, stopping the Create')
+            # stop every time, superseding any queued delayed stop, which
+            # could otherwise leave the Create driving past the cutoff
+            self.drive(0)
+            return False
+
+        x, y, theta = odometry.pose
+        self._pose.update(x=x, y=y, theta=theta)
+        return True
+
     def move_to_next_point(self, x, y, theta):
         """
         TODO
@@ -183,6 +369,41 @@ class Client(Protocol):
         there as well as modify the vector if current is on.
         """
 
+        v, r, duration = self.plan_move(vx, vy)
+        self.drive(v, r=r)
+        # stop moving after the duration, unless superseded by the next move
+        self.drive(0, delay=duration)
+
+    def drive(self, v, r='straight', *, delay=None):
+        """
+        Send a drive command to the Create (see :meth:`Create._drive
+        <atlantic_signatures.create.Create._drive>`), recording it for pose
+        prediction.
+        """
+
+        if self._predictor is not None:
+            # predict the motion of the command as the Create receives it
+            self._predictor.command(time.time() + (delay or 0.0), *self._create._drive_args(v, r))
+        return self._create._drive(v, r=r, delay=delay)
+
+    def drive_direct(self, vl, vr):
+        """
+        Send a drive direct command to the Create, recording it for pose
+        prediction.
+        """
+
+        if self._predictor is not None:
+            self._predictor.command_wheels(time.time(), self._create._bound(vl, 0, 500), self._create._bound(vr, 0, 500))
+        return self._create._drive_direct(vl, vr)
+
+    def plan_move(self, vx, vy):
+        """
+        Return the drive command (speed, turn radius) and its duration that
+        move the Create along the vector (vx, vy): a turn in place if the
+        Create's heading is off by more than angle_cutoff, and a straight move
+        otherwise.
+        """
+
         V = int(sqrt(vx**2 + vy**2))
 
         if V < 11:
@@ -203,14 +424,10 @@ class Client(Protocol):
                 turn_v, r = -delta, 'rotate_cw'
             else:
                 turn_v, r = delta, 'rotate_ccw'
-            self._create._drive(max(turn_v, 30), r=r)  # TODO: figure out the exact speed and duration needed to perform a precise turn
-            time.sleep(0.1)
-            self._create._drive(0)  # stop moving and wait for next command
+            return max(turn_v, 30), r, 0.1  # TODO: figure out the exact speed and duration needed to perform a precise turn
 
         else:
-            self._create._drive(V, r='straight')
-            time.sleep(self._time_step)
-            self._create._drive(0)  # stop moving and wait for next command
+            return V, 'straight', self._time_step
 
     def recv_start(self, payload):
         """
@@ -232,5 +449,127 @@ class Client(Protocol):
         return self._position
 
 
+
+class AsyncClient(AsyncProtocol, Client):
+    """
+    A :class:`Client` whose packet handling runs on asyncio.
+
+    Receiving packets, acting on poses, executing commands and sending
+    heartbeats run as separate concurrent tasks. Poses keep arriving while
+    the Create drives: only the newest one is kept, and it is acted on as
+    soon as the previous one has been handled. Serial writes are queued to the
+    Create's writer thread so they never block the event loop.
+    """
+
+    def run_loop(self):
+        """
+        Handle packets from the host until the connection is closed.
+        """
+
+        asyncio.run(self._serve())
+
+    async def _serve(self):
+        await self._aopen()
+        self._new_pose = asyncio.Event()
+        self._commands = asyncio.Queue()
+        await self._run_tasks(self._receive(), self._control(), self._execute_commands(), self._heartbeat())
+
+    async def _receive(self):
+        """Dispatch packets from the host as they arrive."""
+
+        while True:
+            pb, payload = await self._arecv()
+
+            if pb == PACKETS.POSE:
+                x, y, theta, frame_number, host_timestamp = unpack_pose(payload)
+                if self._frame_number is not None and frame_number <= self._frame_number:
+                    continue  # out-of-date pose
+                self._frame_number, self._host_timestamp = frame_number, host_timestamp
+                x, y, theta = self.compensate_latency(x, y, theta)
+                self._pose.update(x=x, y=y, theta=theta)
+                self.anchor_odometry()
+                if not self._streaming:
+                    self._stream_writer.write(bytes(PACKETS.ACKPOSE))
+                self._new_pose.set()
+            elif pb == PACKETS.DATA:
+                self._pose.update(json.loads(payload))
+                self.anchor_odometry()
+                self._stream_writer.write(bytes(PACKETS.ACKDATA))
+                self._new_pose.set()
+            elif pb == PACKETS.CONFIG:
+                self.load_config(payload)
+                self._stream_writer.write(bytes(PACKETS.ACKCONFIG))
+            elif pb == PACKETS.TABLE:
+                self.load_table(payload)
+                self._stream_writer.write(bytes(PACKETS.ACKTABLE))
+            elif pb == PACKETS.STREAM:
+                self._streaming = True
+                self._stream_writer.write(bytes(PACKETS.ACKSTREAM))
+            elif pb == PACKETS.COMMAND:
+                await self._commands.put(json.loads(payload))
+            elif pb == PACKETS.START:
+                if not (self._started and self._config):
+                    await asyncio.to_thread(self._create._serial_startup, mode=self._starting_mode)
+                    self._started = True
+                self._stream_writer.write(bytes(PACKETS.ACKSTART))
+            elif pb == PACKETS.CLOSE:
+                await self._arecv_close()
+            else:
+                raise OSError("An invalid packet was received: {}".format(pb))
+            await self._stream_writer.drain()
+
+    async def _control(self):
+        """Drive the Create toward the next point, using the newest pose."""
+
+        while True:
+            if not await self._next_pose():
+                continue
+
+            x, y, theta = self._pose['x'], self._pose['y'], self._pose['theta']
+            print(f"x: {x:+8.02f},    y: {y:+8.02f},    theta: {theta:+5.02f}")
+
+            try:
+                self._navigator.check_reached_goal(x, y)
+            except FinalGoalReached:
+                await self._asend_close()
+            dx, dy = self._navigator.net_velocity(x, y)
+            self.move_create(dx, dy)
+
+    async def _next_pose(self):
+        """
+        Wait for a new pose from the host, dead-reckoning one from wheel
+        odometry if none arrives within the control period. Return True if
+        the pose was updated.
+        """
+
+        try:
+            await asyncio.wait_for(self._new_pose.wait(), self._odometry_period)
+        except asyncio.TimeoutError:  # not the builtin TimeoutError before Python 3.11
+            return self.dead_reckon()
+        self._new_pose.clear()
+        return True
+
+    async def _execute_commands(self):
+        """Execute drive commands sent by the host, in order."""
+
+        while True:
+            command = await self._commands.get()
+            if command['opcode'] == OPCODES.DRIVE:
+                self.drive(v=command.get('v', self._default_v), r=command.get('r', 'straight'))
+            elif command['opcode'] == OPCODES.DRIVE_DIRECT:
+                self.drive_direct(vl=command.get('vl', self._default_v), vr=command.get('vr', self._default_v))
+            self._stream_writer.write(bytes(PACKETS.ACKCOMMAND))
+            await self._stream_writer.drain()
+
+    async def _heartbeat(self):
+        """Report liveness to the host while streaming."""
+
+        while True:
+            if self._streaming:
+                frame_number = 0 if self._frame_number is None else self._frame_number
+                await self._asend(PACKETS.HEARTBEAT, HEARTBEAT_STRUCT.pack(frame_number))
+            await asyncio.sleep(HEARTBEAT_INTERVAL)
+
+
 if __name__ == '__main__':
     client = Client(socket.gethostbyname('BIO-TAYLORL02-5820'))
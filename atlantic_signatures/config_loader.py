@@ -102,6 +102,11 @@ REQUIRED_CONFIG_SECTIONS = (
     'Create Properties'
     )
 
+# Sections that are only loaded if they are present in the config file
+OPTIONAL_CONFIG_SECTIONS = (
+    'Noise Properties',
+    )
+
 # (section, option): (type ID, default value, default unit string)
 CONFIG_OPTIONS = {
     ('Field Properties', 'a_inc'): ('<float>', None, None),
@@ -136,9 +141,20 @@ CONFIG_OPTIONS = {
     ('Create Properties', 'agent_time_step'): ('<quantity>', 1.0 * ureg.sec, 'second'),
     ('Create Properties', 'angle_cutoff'): ('<quantity>', 1 * ureg.degree, 'degree'),
     ('Create Properties', 'multimodal_method'): ('<string>', 'direct', None),
+    ('Create Properties', 'multimodal_resolution'): ('<int>', None, None),
     ('Create Properties', 'secular_variation_strategy'): ('<string>', 'none', None),
     ('Create Properties', 'r_multi'): ('<quantity>', 0.1 * ureg.meter, 'meter'),
     ('Create Properties', 'r_goal'): ('<quantity>', 0.5 * ureg.meter, 'meter'),
+    ('Create Properties', 'odometry_control_period'): ('<quantity>', None, 'second'),
+    ('Create Properties', 'max_dead_reckoning'): ('<quantity>', None, 'second'),
+    ('Create Properties', 'prediction_horizon'): ('<quantity>', None, 'second'),
+    ('Create Properties', 'lookup_table_resolution'): ('<quantity>', None, 'meter'),
+    ('Noise Properties', 'mean_beta_noise'): ('<float>', 0.0, None),
+    ('Noise Properties', 'mean_gamma_noise'): ('<float>', 0.0, None),
+    ('Noise Properties', 'std_dev_beta_noise'): ('<float>', 0.0, None),
+    ('Noise Properties', 'std_dev_gamma_noise'): ('<float>', 0.0, None),
+    ('Noise Properties', 'noise_seed'): ('<int>', None, None),
+    ('Noise Properties', 'noise_block_size'): ('<int>', None, None),
     }
 
 
@@ -203,6 +219,13 @@ class Loader:
         config.read(file)
         return config
 
+    def read_config_string(self, string):
+        """Load the text of a config file into a :class:`QuantityConfigParser`."""
+
+        config = QuantityConfigParser(allow_no_value=True)
+        config.read_string(string)
+        return config
+
 
 
 def config_to_dict(parser_object):
@@ -216,8 +239,10 @@ def config_to_dict(parser_object):
         '<string>': parser_object.get
         }
 
+    sections = REQUIRED_CONFIG_SECTIONS + tuple(i for i in OPTIONAL_CONFIG_SECTIONS if parser_object.has_section(i))
+
     cache = {}
-    for section in REQUIRED_CONFIG_SECTIONS:
+    for section in sections:
         cache[section] = {}
         for option in parser_object.options(section):
             id, default, unit = CONFIG_OPTIONS.get((section, option), ('<string>', None, None))
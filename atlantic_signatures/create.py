@@ -2,10 +2,15 @@
 The :mod:`atlantic_signatures.create` module implements ... TODO
 """
 
+from collections import deque
+from concurrent.futures import Future
 from enum import IntEnum
+from math import cos, pi, sin
 import struct
+import threading
 import time
 
+import numpy as np
 import serial
 from serial.tools.list_ports import comports
 
@@ -23,11 +28,37 @@ class OPCODES(IntEnum):
     FULL         = 0x84
     DRIVE        = 0x89
     DRIVE_DIRECT = 0x91
+    STREAM       = 0x94
+    PAUSE_RESUME_STREAM = 0x96
 
     def __bytes__(self) -> bytes:
         return bytes([self.value])
 
 
+class SENSORS(IntEnum):
+    """
+    IDs of the sensor packets that can be streamed.
+    """
+
+    DISTANCE             = 19
+    ANGLE                = 20
+    LEFT_ENCODER_COUNTS  = 43
+    RIGHT_ENCODER_COUNTS = 44
+
+
+# The struct format and the sample field of each sensor packet
+SENSOR_FORMATS = {
+    SENSORS.DISTANCE: ('>h', 'distance'),
+    SENSORS.ANGLE: ('>h', 'angle'),
+    SENSORS.LEFT_ENCODER_COUNTS: ('>H', 'left_encoder_counts'),
+    SENSORS.RIGHT_ENCODER_COUNTS: ('>H', 'right_encoder_counts'),
+    }
+
+ODOMETRY_SENSORS = (SENSORS.LEFT_ENCODER_COUNTS, SENSORS.RIGHT_ENCODER_COUNTS, SENSORS.ANGLE)
+
+STREAM_HEADER = 19  # The first byte of every frame of streamed sensor data
+
+
 def list_ports():
     """List all serial ports that are opened."""
     return [port.device for port in comports()]
@@ -40,6 +71,255 @@ def find_port():
                 return port.device
 
 
+class SerialWriter(threading.Thread):
+    """
+    A background thread writing commands to a serial port.
+
+    Commands are written in the order they are submitted, spaced by at least
+    *command_delay* seconds, so that callers never wait on serial I/O. Each
+    submission returns a :class:`~concurrent.futures.Future` resolved once the
+    command is written.
+
+    A command submitted with a *key* supersedes the commands with the same key
+    at the end of the queue, which were not written yet: the superseded
+    commands are dropped and their futures cancelled. E.g. only the latest of
+    a burst of drive commands is sent.
+    """
+
+    def __init__(self, serial_port, command_delay):
+        """Initializer for a new SerialWriter."""
+
+        super().__init__(name='serial-writer', daemon=True)
+        self._serial = serial_port
+        self._command_delay = command_delay
+        self._queue = deque()
+        self._changed = threading.Condition()
+        self._closed = False
+        self._last_write = float('-inf')
+
+    def submit(self, data, key=None, delay=None, supersede=True):
+        """
+        Queue *data* to be written at least *delay* seconds (by default the
+        command delay) after the previous command.
+
+        If *supersede* is False, the command never replaces a queued one.
+        """
+
+        future = Future()
+        entry = (data, key, self._command_delay if delay is None else delay, future)
+
+        with self._changed:
+            if self._closed:
+                raise RuntimeError('The serial writer has been closed')
+            while supersede and key is not None and self._queue and self._queue[-1][1] == key:
+                self._queue.pop()[3].cancel()
+            self._queue.append(entry)
+            self._changed.notify()
+        return future
+
+    def run(self):
+        while True:
+            with self._changed:
+                while not self._queue:
+                    if self._closed:
+                        return
+                    self._changed.wait()
+
+                # the queued command can be superseded while waiting for it to
+                # be due, so check it again after every wait
+                data, _, delay, future = self._queue[0]
+                wait = self._last_write + delay - time.monotonic()
+                if wait > 0:
+                    self._changed.wait(wait)
+                    continue
+                self._queue.popleft()
+
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                future.set_result(self._serial.write(data))
+            except Exception as err:
+                future.set_exception(err)
+            self._last_write = time.monotonic()
+
+    def flush(self, timeout=None):
+        """Wait until all queued commands have been written."""
+
+        with self._changed:
+            if not self._queue:
+                return
+            future = self._queue[-1][3]
+        try:
+            future.result(timeout)
+        except Exception:
+            pass
+
+    def close(self):
+        """Write the queued commands, then stop the thread."""
+
+        with self._changed:
+            self._closed = True
+            self._changed.notify()
+        self.join()
+
+class SensorReader(threading.Thread):
+    """
+    A background thread reading the sensor packets streamed by the Create.
+
+    Frames of streamed data are checked and parsed into samples, which are
+    kept in a ring buffer of the most recent *capacity* samples. Samples are
+    also passed to the subscribed callbacks, as they are read.
+    """
+
+    def __init__(self, serial_port, sensors, capacity=1024):
+        """Initializer for a new SensorReader."""
+
+        super().__init__(name='sensor-reader', daemon=True)
+        self._serial = serial_port
+        self._sensors = tuple(SENSORS(sensor) for sensor in sensors)
+        self._dtype = np.dtype([('time', 'f8')] + [(SENSOR_FORMATS[sensor][1], SENSOR_FORMATS[sensor][0][1:]) for sensor in self._sensors])
+        self._samples = np.zeros(capacity, dtype=self._dtype)
+        self._count = 0
+        self._lock = threading.Lock()
+        self._buffer = bytearray()
+        self._callbacks = []
+        self._stopped = False
+        self.checksum_errors = 0
+        self.error = None
+
+    def subscribe(self, callback):
+        """Call *callback* with every new sample."""
+
+        self._callbacks.append(callback)
+
+    def run(self):
+        try:
+            while not self._stopped:
+                data = self._serial.read(max(1, self._serial.in_waiting))
+                if data:
+                    self.feed(data, time.monotonic())
+        except Exception as err:
+            if not self._stopped:
+                self.error = err
+
+    def feed(self, data, t):
+        """Parse the frames of streamed data in *data*, read at time *t*."""
+
+        self._buffer += data
+        while True:
+            start = self._buffer.find(STREAM_HEADER)
+            if start < 0:
+                self._buffer.clear()
+                return
+            del self._buffer[:start]
+
+            if len(self._buffer) < 2 or len(self._buffer) < self._buffer[1] + 3:
+                return
+            size = self._buffer[1] + 3
+            if sum(self._buffer[:size]) & 0xff:
+                # not a frame, or a corrupted one: resynchronize at the next header
+                self.checksum_errors += 1
+                del self._buffer[0]
+                continue
+
+            sample = self._parse(bytes(self._buffer[2:size - 1]), t)
+            del self._buffer[:size]
+            if sample is None:
+                continue
+            with self._lock:
+                self._samples[self._count % len(self._samples)] = sample
+                self._count += 1
+            for callback in self._callbacks:
+                callback(sample)
+
+    def _parse(self, payload, t):
+        sample = np.zeros((), dtype=self._dtype)
+        sample['time'] = t
+        i = 0
+        while i < len(payload):
+            sensor = payload[i]
+            if sensor not in SENSOR_FORMATS:
+                return None
+            fmt, field = SENSOR_FORMATS[sensor]
+            sample[field], = struct.unpack_from(fmt, payload, i + 1)
+            i += 1 + struct.calcsize(fmt)
+        return sample
+
+    def samples(self, n=None):
+        """Return the most recent *n* samples (by default all buffered), oldest first."""
+
+        with self._lock:
+            available = min(self._count, len(self._samples))
+            n = available if n is None else min(n, available)
+            indices = np.arange(self._count - n, self._count) % len(self._samples)
+            return self._samples[indices]
+
+    def stop(self):
+        """Stop reading, and wait for the thread to finish."""
+
+        self._stopped = True
+        self.join()
+
+
+class Odometry:
+    """
+    Dead-reckons the Create's pose from its wheel encoder counts.
+
+    The pose is anchored to an absolute one, e.g. from the Vicon system, by
+    :meth:`reset`, and then integrated from the encoder counts of the samples
+    passed to :meth:`update`.
+    """
+
+    def __init__(self, shaft_length, wheel_diameter, encoder_counts):
+        """Initializer for a new Odometry."""
+
+        self._shaft_length = shaft_length
+        self._mm_per_count = pi * wheel_diameter / encoder_counts
+        self._lock = threading.Lock()
+        self._pose = None
+        self._counts = None
+        self._anchored_at = None
+
+    def reset(self, x, y, theta):
+        """Anchor the dead-reckoned pose to (*x*, *y*, *theta*)."""
+
+        with self._lock:
+            self._pose = (x, y, theta)
+            self._anchored_at = time.monotonic()
+
+    def update(self, sample):
+        """Integrate the wheel motion since the previous sample."""
+
+        counts = (int(sample['left_encoder_counts']), int(sample['right_encoder_counts']))
+        with self._lock:
+            previous, self._counts = self._counts, counts
+            if previous is None or self._pose is None:
+                return
+
+            # the 16-bit counters wrap around
+            dl, dr = (((c - p + 2**15) % 2**16 - 2**15) * self._mm_per_count for c, p in zip(counts, previous))
+            d = (dl + dr) / 2
+            dtheta = (dr - dl) / self._shaft_length
+
+            x, y, theta = self._pose
+            heading = theta + dtheta / 2
+            theta = (theta + dtheta + pi) % (2 * pi) - pi
+            self._pose = (x + d * cos(heading), y + d * sin(heading), theta)
+
+    @property
+    def pose(self):
+        """The dead-reckoned pose (x, y, theta), or None before the first :meth:`reset`."""
+
+        return self._pose
+
+    @property
+    def age(self):
+        """The number of seconds since the pose was last anchored."""
+
+        if self._anchored_at is None:
+            return float('inf')
+        return time.monotonic() - self._anchored_at
+
 
 class Create:
     """
@@ -47,6 +327,11 @@ class Create:
 
     Limited API for controlling the iRobot Create2. Only the subset of commands
     related to driving and vital functionality are implemented.
+
+    Commands are written by a :class:`SerialWriter` thread and return a
+    future resolved once they are written. Queued drive commands are
+    superseded by newer ones. Once sensor streaming is started, wheel
+    odometry is available in :attr:`odometry`.
     """
 
     _SPECIAL_TURN_RADII = {
@@ -65,82 +350,139 @@ class Create:
 
     _SHAFT_LENGTH   = 235.0  # The Create's wheels are 235 mm apart
     _WHEEL_DIAMETER = 72.0  # The Create's wheels have a diameter of 72 mm
+    _ENCODER_COUNTS = 508.8  # Encoder counts per revolution of a wheel
 
     def __init__(self, port=None):
         """Initializer for a new Create."""
 
         if port is None:
             port = find_port()
-        self._serial = serial.Serial(port=port, baudrate=115200)
+        # reads time out, so that the sensor reader can be stopped
+        self._serial = serial.Serial(port=port, baudrate=115200, timeout=0.1)
+        self._writer = SerialWriter(self._serial, self._COMMAND_DELAY)
+        self._writer.start()
+        self._sensors = None
+        self._odometry = None
+        self._is_driving = False
         self._serial_startup()
 
-    def _serial_send(self, fmt, *v):
+    def _serial_send(self, fmt, *v, key=None, delay=None, supersede=True):
         """
-        TODO
+        Queue a command to be written, returning its future. See
+        :meth:`SerialWriter.submit`.
         """
 
-        self._serial.write(struct.pack(fmt, *v))
-        time.sleep(self._COMMAND_DELAY)
+        return self._writer.submit(struct.pack(fmt, *v), key=key, delay=delay, supersede=supersede)
 
     def _start(self):
         """
         TODO
         """
 
-        self._serial_send('B', OPCODES.START)
+        return self._serial_send('B', OPCODES.START)
 
     def _reset(self):
         """
         TODO
         """
 
-        self._serial_send('B', OPCODES.RESET)
+        return self._serial_send('B', OPCODES.RESET)
 
     def _stop(self):
         """
         TODO
         """
 
-        self._serial_send('B', OPCODES.STOP)
+        return self._serial_send('B', OPCODES.STOP)
 
     def _safe(self):
         """
         TODO
         """
 
-        self._serial_send('B', OPCODES.SAFE)
+        return self._serial_send('B', OPCODES.SAFE)
 
     def _full(self):
         """
         TODO
         """
 
-        self._serial_send('B', OPCODES.FULL)
+        return self._serial_send('B', OPCODES.FULL)
 
-    def _drive(self, v, r='straight'):
+    def _drive(self, v, r='straight', *, delay=None):
         """
-        TODO
+        Drive at speed *v* (mm/s) along a turn of radius *r* (mm).
+
+        If *delay* is given, the command is written *delay* seconds after the
+        previous one, e.g. to stop after driving for some time, and it does
+        not supersede the queued drive commands.
         """
 
-        if r in self._SPECIAL_TURN_RADII:
-            r = self._SPECIAL_TURN_RADII[r]
-        else:
-            r = self._bound(r, 0, 2000)
+        v, r = self._drive_args(v, r)
+        future = self._serial_send('>B2h', OPCODES.DRIVE, v, r, key=OPCODES.DRIVE, delay=delay, supersede=delay is None)
+        self._set_driving_when_written(future, v > self._MIN_MOVING_SPEED)
+        return future
 
-        v = self._bound(v, 0, 500)
-        self._serial_send('>B2h', OPCODES.DRIVE, v, r)
-        self._is_driving = v > self._MIN_MOVING_SPEED
+    @classmethod
+    def _drive_args(cls, v, r='straight'):
+        """
+        Return the speed and turn radius actually sent by :meth:`_drive` for
+        speed *v* and turn radius *r*: special radii are mapped to their
+        values, and numeric ones are rounded and bounded.
+        """
+
+        if r in cls._SPECIAL_TURN_RADII:
+            r = cls._SPECIAL_TURN_RADII[r]
+        else:
+            r = cls._bound(r, 0, 2000)
+        return cls._bound(v, 0, 500), r
 
-    def _drive_direct(self, vl, vr):
+    def _drive_direct(self, vl, vr, *, delay=None):
         """
-        TODO
+        Drive with left and right wheel speeds *vl* and *vr* (mm/s). See
+        :meth:`_drive` for *delay*.
         """
 
         vl, vr = self._bound(vl, 0, 500), self._bound(vr, 0, 500)
 
-        self._serial_send('>B2h', OPCODES.DRIVE_DIRECT, vr, vl)
-        self._is_driving = (abs(vl + vr) / 2 > self._MIN_MOVING_SPEED or
-                            abs(vr - vl) > self._MIN_MOVING_SPEED)
+        future = self._serial_send('>B2h', OPCODES.DRIVE_DIRECT, vr, vl, key=OPCODES.DRIVE, delay=delay, supersede=delay is None)
+        self._set_driving_when_written(future, abs(vl + vr) / 2 > self._MIN_MOVING_SPEED or
+                                               abs(vr - vl) > self._MIN_MOVING_SPEED)
+        return future
+
+    def _set_driving_when_written(self, future, driving):
+        """
+        Update :attr:`is_driving` once the drive command of *future* is
+        written by the serial writer, rather than when it is queued: queued
+        commands can be delayed, or superseded and never written.
+        """
+
+        def written(future):
+            if not future.cancelled() and future.exception() is None:
+                self._is_driving = driving
+
+        future.add_done_callback(written)
+
+    def _stream(self, sensors=ODOMETRY_SENSORS):
+        """
+        Start streaming the given sensor packets (every 15 ms), read by a
+        :class:`SensorReader`, and integrating wheel odometry from them.
+        """
+
+        if self._sensors is None:
+            self._sensors = SensorReader(self._serial, sensors)
+            if {SENSORS.LEFT_ENCODER_COUNTS, SENSORS.RIGHT_ENCODER_COUNTS} <= set(sensors):
+                self._odometry = Odometry(self._SHAFT_LENGTH, self._WHEEL_DIAMETER, self._ENCODER_COUNTS)
+                self._sensors.subscribe(self._odometry.update)
+            self._sensors.start()
+        return self._serial_send(f'>BB{len(sensors)}B', OPCODES.STREAM, len(sensors), *sensors)
+
+    def _pause_stream(self):
+        """
+        Pause streaming sensor packets.
+        """
+
+        return self._serial_send('>BB', OPCODES.PAUSE_RESUME_STREAM, 0)
 
     def _serial_startup(self, mode='full'):
         """
@@ -159,7 +501,12 @@ class Create:
         TODO
         """
 
+        if self._sensors is not None:
+            self._pause_stream()
         self._stop()  # needed to exit full mode and allow charging after use
+        self._writer.close()
+        if self._sensors is not None:
+            self._sensors.stop()
         self._serial.close()
 
     @staticmethod
@@ -171,6 +518,24 @@ class Create:
         qsgn = -1 if q < 0 else 1
         return qsgn * min(max(minq, abs(round(q))), maxq)
 
+    @property
+    def sensors(self):
+        """
+        The :class:`SensorReader` of the streamed sensor packets, or None if
+        they are not streamed.
+        """
+
+        return self._sensors
+
+    @property
+    def odometry(self):
+        """
+        The wheel :class:`Odometry`, or None if the encoder counts are not
+        streamed.
+        """
+
+        return self._odometry
+
     @property
     def is_driving(self):
         """
@@ -3,20 +3,31 @@ The :mod:`atlantic_signatures.host` module implements ... TODO
 """
 
 from __future__ import absolute_import, print_function
+import asyncio
+from collections import namedtuple
 import os
 import os.path
 import json
+from math import isnan
 import select
 import socket
 import sys
+import threading
 import time
 
 
+from atlantic_signatures.calculate import Current, Field
 from atlantic_signatures.config_loader import config_to_dict, Loader
+from atlantic_signatures.lookup_table import LookupTable
+from atlantic_signatures.run_file import FLUSH_INTERVAL, RUN_SUFFIX, RunLogger
 from atlantic_signatures.socket_protocol import *
+from atlantic_signatures.vicon_replay import EndOfRecording, RecordingClient, ReplayClient
 
 DATA_DIR = os.path.join(os.getcwd(), 'data')
 
+# Number of consecutive occluded frames after which the Create is assumed lost
+MAX_OCCLUDED_FRAMES = 10
+
 
 def lazy_load_vicon():
     """
@@ -27,12 +38,93 @@ def lazy_load_vicon():
     from vicon_dssdk import ViconDataStream
 
 
+ViconFrame = namedtuple('ViconFrame', ('x', 'y', 'theta', 'frame', 'timestamp', 'occluded'))
+
+
+class ViconAcquisition(threading.Thread):
+    """
+    A background thread pulling frames from the Vicon system.
+
+    The thread reads the tracked object's pose from every frame (the Vicon
+    client should be in ServerPush mode) and publishes it, as a
+    :class:`ViconFrame`, into a single slot. Publishing replaces the slot's
+    contents in one assignment, so :attr:`latest` can be read at any time
+    without locking. :meth:`wait_for_frame` additionally allows waiting for a
+    frame newer than one already seen.
+    """
+
+    def __init__(self, vicon_client, tracking_object):
+        """Initializer for a new ViconAcquisition."""
+
+        super().__init__(name='vicon-acquisition', daemon=True)
+        self._vicon_client = vicon_client
+        self._tracking_object = tracking_object
+        self._latest = None
+        self._new_frame = threading.Condition()
+        self._stopped = False
+        self.error = None
+
+    @property
+    def latest(self):
+        """
+        The most recent :class:`ViconFrame`, or None if none was read yet.
+        """
+
+        return self._latest
+
+    def run(self):
+        try:
+            while not self._stopped:
+                self._latest = self._read_frame()
+                with self._new_frame:
+                    self._new_frame.notify_all()
+        except Exception as err:
+            self.error = err
+            with self._new_frame:
+                self._new_frame.notify_all()
+
+    def _read_frame(self):
+        self._vicon_client.GetFrame()
+
+        # the frame was captured the Vicon system's latency before it was
+        # received
+        latency = self._vicon_client.GetLatencyTotal()
+        timestamp = time.time() - (0.0 if isnan(latency) else latency)
+        p_dat, p_oc = self._vicon_client.GetSegmentGlobalTranslation(*self._tracking_object)
+        a_dat, a_oc = self._vicon_client.GetSegmentGlobalRotationEulerXYZ(*self._tracking_object)
+        return ViconFrame(p_dat[0], p_dat[1], a_dat[2], self._vicon_client.GetFrameNumber(), timestamp, bool(p_oc or a_oc))
+
+    def wait_for_frame(self, after=None, timeout=None):
+        """
+        Return the latest frame, waiting up to *timeout* seconds for one newer
+        than frame number *after* if it is given.
+        """
+
+        def ready():
+            latest = self._latest
+            return self.error is not None or (latest is not None and (after is None or latest.frame > after))
+
+        if not ready():
+            with self._new_frame:
+                if not self._new_frame.wait_for(ready, timeout):
+                    raise TimeoutError('No new frame was received from the Vicon system')
+        if self.error is not None:
+            raise self.error
+        return self._latest
+
+    def stop(self):
+        """Stop acquiring frames, after the frame currently being read."""
+
+        self._stopped = True
+
+
 class Host(Protocol):
     """
     TODO
     """
 
-    def __init__(self, config_file=None, objectname=None, host=None, timeout=30):
+    def __init__(self, config_file=None, objectname=None, host=None, timeout=30, binary_data=True, streaming=False,
+                 vicon_client=None, replay=None, realtime_replay=True, record=None, flush_interval=FLUSH_INTERVAL):
         """Initializer for a new Host."""
 
         if config_file is None:
@@ -43,13 +135,23 @@ class Host(Protocol):
             raise FileNotFoundError('The config file: %s was not found' % config_file)
         self._config_file = config_file
 
-        lazy_load_vicon()
+        # frames are served by a stand-in for the Vicon system (e.g. a
+        # recorded session), or by the Vicon system, in which case they can be
+        # recorded
+        if replay is not None:
+            vicon_client = ReplayClient(replay, realtime=realtime_replay)
+        self._vicon_client = vicon_client
+        self._record = record
+        if vicon_client is None:
+            lazy_load_vicon()
 
         # Real create object name is: 'Create2'
         if objectname is not None:
             self.tracking_object = (objectname, objectname)
 
         self._timeout = timeout
+        self._binary_data = binary_data or streaming  # streaming requires binary poses
+        self._streaming = streaming
         self._host = self.get_proper_ip() if host is None else host
 
         if not isinstance(self._host, str):
@@ -61,10 +163,14 @@ class Host(Protocol):
         test_num = 1
 
         for file in os.listdir(DATA_DIR):
-            if file.startswith('Test') and file.endswith('.csv'):
+            if file.startswith('Test') and file.endswith(('.csv', RUN_SUFFIX)):
                 test_num += 1
 
-        self._data_file = open(os.path.join(DATA_DIR, 'Test-%d.csv' % test_num), 'w')
+        with open(config_file) as f:
+            config_text = f.read()
+        # poses are logged from a background thread, off the control loop
+        self._data_file = RunLogger(os.path.join(DATA_DIR, 'Test-%d%s' % (test_num, RUN_SUFFIX)), config_text,
+                                    flush_interval=flush_interval, source='host', config_file=config_file)
         print(f'Writing data to file: {self._data_file.name}')
         print()
         self.start()
@@ -90,7 +196,14 @@ class Host(Protocol):
                 self._data_file.close()
                 raise RuntimeError('No tracker objects were provided and/or could be found')
 
+        self._acquisition = ViconAcquisition(self._vicon_client, self.tracking_object)
+        self._acquisition.start()
+        self._last_frame = None
+
         self.send_config(self._config_file)
+        if self._streaming:
+            self._send(bytes(PACKETS.STREAM))
+            self._last_heartbeat = time.time()
         self.t0 = time.time()
         self.send_loop()
 
@@ -100,16 +213,7 @@ class Host(Protocol):
         """
 
         try:
-            print('Sending data to client periodically')
-            print()
-            while True:
-                r, w, _ = select.select([self._client_sock], [self._client_sock], [])
-                if r:
-                    self.recv_close(None)
-
-                if w:
-                    self.send_data()
-                    time.sleep(0.1)  # throttle sending data, allowing time for client to determine if it has reached the last goal and signal the end
+            self.run_loop()
         except BreakLoop:
             pass
         except TimeoutError:
@@ -123,10 +227,60 @@ class Host(Protocol):
             else:
                 raise
         finally:
-            # always cleanly close the socket
+            self._acquisition.stop()
+            self._data_file.close()
+            if isinstance(self._vicon_client, RecordingClient):
+                self._vicon_client.close()
+                print(f'Vicon frames were recorded to file: {self._record}')
+
+            # always cleanly close the sockets
+            self._client_sock.close()
             self._sock.close()
             print('Socket has been closed')
 
+    def run_loop(self):
+        """
+        Send poses to the client until the connection is closed.
+        """
+
+        if self._streaming:
+            print('Streaming data to client')
+            print()
+            while True:
+                # poses are paced by the Vicon frame rate, as GetFrame
+                # waits for the next frame in ServerPush mode
+                while self._pending():
+                    self.recv_packet()
+                if time.time() - self._last_heartbeat > self._timeout:
+                    raise TimeoutError
+                self.send_data()
+
+        print('Sending data to client periodically')
+        print()
+        while True:
+            r, w, _ = select.select([self._client_sock], [self._client_sock], [])
+            if r:
+                self.recv_close(None)
+
+            if w:
+                self.send_data()
+                time.sleep(0.1)  # throttle sending data, allowing time for client to determine if it has reached the last goal and signal the end
+
+    def recv_packet(self):
+        """
+        Read a packet sent by the client while streaming: either a heartbeat
+        or a request to close the connection.
+        """
+
+        pb, payload = self._recv()
+        if pb == PACKETS.HEARTBEAT:
+            self._last_heartbeat = time.time()
+            self._client_frame_number, = HEARTBEAT_STRUCT.unpack(payload)
+        elif pb == PACKETS.CLOSE:
+            self.recv_close(payload)
+        else:
+            raise OSError("An invalid packet was received: {}".format(pb))
+
     def _start_host(self):
         """
         TODO
@@ -170,6 +324,11 @@ class Host(Protocol):
         TODO
         """
 
+        if self._vicon_client is not None:
+            print(f'Using a stand-in for the Vicon system: {type(self._vicon_client).__name__}')
+            print()
+            return
+
         try:
             self._vicon_client = ViconDataStream.Client()
             self._vicon_client.Connect('BIO-TAYLORL02-5820:801')
@@ -186,6 +345,11 @@ class Host(Protocol):
             self._vicon_client.EnableUnlabeledMarkerData()
             self._vicon_client.SetStreamMode(ViconDataStream.Client.StreamMode.EServerPush)
 
+            if self._record is not None:
+                self._vicon_client = RecordingClient(self._vicon_client, self._record)
+                print(f'Recording Vicon frames to file: {self._record}')
+                print()
+
         except ViconDataStream.DataStreamException as err:
             print(
                 'An error occured with the Vicon System during startup. '
@@ -195,33 +359,44 @@ class Host(Protocol):
                 self._sock.close()
             sys.exit(1)
 
-    def send_data(self, *, level=0):
+    def send_data(self):
         """
-        TODO
+        Send the latest pose of the tracked object to the client.
+
+        The pose is taken from the acquisition thread's latest frame. While
+        streaming, a frame newer than the last one sent is waited for. If the
+        object is occluded, up to MAX_OCCLUDED_FRAMES frames are tried before
+        the Create is assumed to be lost.
         """
 
-        if level > 9:
+        after = self._last_frame if self._streaming else None
+        for _ in range(MAX_OCCLUDED_FRAMES):
+            try:
+                frame = self._acquisition.wait_for_frame(after, timeout=self._timeout)
+            except EndOfRecording:
+                print('The end of the Vicon recording was reached')
+                self.send_close()
+            if not frame.occluded:
+                break
+            print("The object was occluded. Attempting to resend data")
+            after = frame.frame
+        else:
             print(
                 'The Create has been occluded for the past 10 frames and is '
                 'assumed to be lost'
                 )
             self.send_close()
+        self._last_frame = frame.frame
 
-        self._vicon_client.GetFrame()
-        p_dat, p_oc = self._vicon_client.GetSegmentGlobalTranslation(*self.tracking_object)
-        a_dat, a_oc = self._vicon_client.GetSegmentGlobalRotationEulerXYZ(*self.tracking_object)
-
-        if p_oc or a_oc:
-            print("The object was occluded. Attempting to resend data")
-            self.send_data(level=level+1)
-
-        data = {i: j for i, j in zip(('x', 'y'), p_dat)}
-        data['theta'] = a_dat[2]
+        data = {'x': frame.x, 'y': frame.y, 'theta': frame.theta}
 
-        self._data_file.write(','.join(str(param) for param in data.values()) + ',%f\n' % (time.time() - self.t0))
+        self._data_file.append(frame.timestamp - self.t0, frame.x, frame.y, frame.theta, frame=frame.frame)
 
         try:
-            self._send(PACKETS.DATA, json.dumps(data).encode('utf-8'))
+            if self._binary_data:
+                self._send(PACKETS.POSE, pack_pose(frame.x, frame.y, frame.theta, frame.frame, frame.timestamp), ack=not self._streaming)
+            else:
+                self._send(PACKETS.DATA, json.dumps(data).encode('utf-8'))
         except:
             self._data_file.close()
             raise
@@ -239,14 +414,30 @@ class Host(Protocol):
         print()
 
         try:
-            with open(config_file) as f:
-                self._data_file.write(f.read() + '\n')
-                self._data_file.write('X (mm),\tY (mm),\tTheta (rad),\tTime (sec)\n')
             self._send(PACKETS.CONFIG, json.dumps(config).encode('utf-8'))
+            self.send_lookup_table(config)
         except:
             self._data_file.close()
             raise
 
+    def send_lookup_table(self, config):
+        """
+        Precompute the navigation lookup table, if the config has a
+        lookup_table_resolution, and send it to the client.
+        """
+
+        current = Current.from_cache(config)
+        table = LookupTable.from_cache(config, Field.from_cache(config), current)
+        if table is None:
+            return
+
+        b = table.to_bytes()
+        ny, nx = table.shape
+        print(f'Sending a {nx} x {ny} navigation lookup table ({len(b) / 1024:.0f} KiB)')
+        print(f'Maximum interpolated current error: {table.max_current_error(current):.3g} mm/s')
+        print()
+        self._send(bytes(PACKETS.TABLE), b)
+
     @staticmethod
     def get_proper_ip():
         """
@@ -275,5 +466,94 @@ class Host(Protocol):
                     return network
 
 
+
+class AsyncHost(AsyncProtocol, Host):
+    """
+    A :class:`Host` whose streaming loop runs on asyncio.
+
+    After the usual config handshake, Vicon acquisition, pose sending and
+    handling of the client's heartbeat/close packets run as separate
+    concurrent tasks. Vicon frames come from the acquisition thread, so the
+    event loop sleeps while it waits for frames or client packets instead of
+    polling. Poses are always streamed.
+    """
+
+    def __init__(self, *args, **kwargs):
+        """Initializer for a new AsyncHost."""
+
+        kwargs['streaming'] = True
+        super().__init__(*args, **kwargs)
+
+    def run_loop(self):
+        """
+        Serve the client until the connection is closed.
+        """
+
+        print('Streaming data to client')
+        print()
+        asyncio.run(self._serve())
+
+    async def _serve(self):
+        await self._aopen()
+        self._latest_pose = None
+        self._new_pose = asyncio.Event()
+        await self._run_tasks(self._acquire(), self._stream_poses(), self._handle_client())
+
+    async def _acquire(self):
+        """Publish each new unoccluded frame from the acquisition thread."""
+
+        after = None
+        occluded_frames = 0
+        while True:
+            try:
+                frame = await asyncio.to_thread(self._acquisition.wait_for_frame, after, self._timeout)
+            except EndOfRecording:
+                print('The end of the Vicon recording was reached')
+                await self._asend_close()
+            after = frame.frame
+            if frame.occluded:
+                occluded_frames += 1
+                print("The object was occluded. Attempting to resend data")
+                if occluded_frames >= MAX_OCCLUDED_FRAMES:
+                    print(
+                        'The Create has been occluded for the past 10 frames and is '
+                        'assumed to be lost'
+                        )
+                    await self._asend_close()
+                continue
+
+            occluded_frames = 0
+            self._latest_pose = frame
+            self._new_pose.set()
+
+    async def _stream_poses(self):
+        """Send each new pose to the client as it is acquired."""
+
+        while True:
+            await self._new_pose.wait()
+            self._new_pose.clear()
+
+            frame = self._latest_pose
+            self._data_file.append(frame.timestamp - self.t0, frame.x, frame.y, frame.theta, frame=frame.frame)
+            await self._asend(PACKETS.POSE, pack_pose(frame.x, frame.y, frame.theta, frame.frame, frame.timestamp))
+
+    async def _handle_client(self):
+        """Receive the client's heartbeats, until it closes the connection."""
+
+        while True:
+            try:
+                pb, payload = await asyncio.wait_for(self._arecv(), self._timeout)
+            except asyncio.TimeoutError:
+                # not the builtin TimeoutError handled by send_loop before
+                # Python 3.11
+                raise TimeoutError('No packet was received from the client') from None
+            if pb == PACKETS.HEARTBEAT:
+                self._client_frame_number, = HEARTBEAT_STRUCT.unpack(payload)
+            elif pb == PACKETS.CLOSE:
+                await self._arecv_close()
+            else:
+                raise OSError("An invalid packet was received: {}".format(pb))
+
+
 if __name__ == '__main__':
     Host()
@@ -0,0 +1,164 @@
+"""
+The :mod:`atlantic_signatures.lookup_table` module implements a precomputed
+navigation lookup table.
+
+Evaluating the magnetic field and the ocean current at every step is slow on
+the client's Raspberry Pi. Instead, the host can sample the magnetic signature
+(beta, gamma) of every circuit and the current on a regular grid covering the
+boundary conditions, and send it to the client once, after the config. The
+:class:`Navigator <atlantic_signatures.navigator.Navigator>` then bilinearly
+interpolates the grid. The magnetic field being linear, its interpolation is
+exact; the error in the current shrinks with the grid spacing.
+
+The table is serialized as a small header followed by the grid values, as
+little-endian float32 arrays:
+
+    ========== ================================================================
+    Field      Contents
+    ========== ================================================================
+    header     :data:`HEADER_STRUCT`: x_min, x_max, y_min, y_max, nx, ny and
+               the number of circuits
+    values     float32 array of shape (ny, nx, 2 * circuits + 2): beta and gamma
+               of each circuit, then the x- and y-components of the current
+    ========== ================================================================
+"""
+
+from math import floor
+import struct
+
+import numpy as np
+
+
+HEADER_STRUCT = struct.Struct('<4d3I')
+
+
+class LookupTable:
+    """
+    A grid of magnetic signatures and ocean current velocities.
+
+    Parameters:
+        bounds : tuple of four floats
+            The area covered by the grid: x_min, x_max, y_min, y_max (mm)
+        values : ndarray
+            The grid values, of shape (ny, nx, 2 * circuits + 2): beta and
+            gamma of each circuit, then the x- and y-components of the current
+            (mm/s), at x (along axis 1) and y (along axis 0) evenly spaced over
+            the bounds
+    """
+
+    def __init__(self, bounds, values):
+        """Initializer for a new LookupTable."""
+
+        self._x_min, self._x_max, self._y_min, self._y_max = (float(bound) for bound in bounds)
+        self._values = np.asarray(values, dtype=np.float32)
+        self._ny, self._nx, channels = self._values.shape
+        self._circuits = (channels - 2) // 2
+        self._dx = (self._x_max - self._x_min) / (self._nx - 1)
+        self._dy = (self._y_max - self._y_min) / (self._ny - 1)
+
+        # point-wise lookups index nested lists, which is much faster than
+        # indexing the array one scalar at a time
+        self._rows = self._values.tolist()
+
+    @classmethod
+    def compute(cls, field, current, circuits, bounds, resolution):
+        """
+        Sample the magnetic signature of every circuit, and the current, on a
+        grid over *bounds* with a spacing of at most *resolution* (mm).
+        """
+
+        x_min, x_max, y_min, y_max = bounds
+        nx = max(2, int(np.ceil((x_max - x_min) / resolution)) + 1)
+        ny = max(2, int(np.ceil((y_max - y_min) / resolution)) + 1)
+        x, y = np.meshgrid(np.linspace(x_min, x_max, nx), np.linspace(y_min, y_max, ny))
+
+        channels = []
+        for n in range(circuits):
+            channels.extend(field.calculate(x, y, n=n))
+        channels.extend(current.calculate(x, y))
+        return cls(bounds, np.stack(np.broadcast_arrays(*channels), axis=-1))
+
+    @classmethod
+    def from_cache(cls, cache, field, current):
+        """
+        Compute the lookup table described by a config dictionary, or return
+        None if it has no lookup_table_resolution.
+        """
+
+        resolution = cache['Create Properties'].get('lookup_table_resolution')
+        if resolution is None:
+            return None
+        boundary = cache['Boundary Conditions']
+        bounds = (boundary['x_min'], boundary['x_max'], boundary['y_min'], boundary['y_max'])
+        return cls.compute(field, current, cache['Goal Properties'].get('circuits', 1), bounds, resolution)
+
+    def to_bytes(self):
+        """Serialize the table."""
+
+        header = HEADER_STRUCT.pack(self._x_min, self._x_max, self._y_min, self._y_max, self._nx, self._ny, self._circuits)
+        return header + self._values.astype('<f4').tobytes()
+
+    @classmethod
+    def from_bytes(cls, b):
+        """Deserialize a table serialized by :meth:`to_bytes`."""
+
+        x_min, x_max, y_min, y_max, nx, ny, circuits = HEADER_STRUCT.unpack_from(b)
+        values = np.frombuffer(b, dtype='<f4', offset=HEADER_STRUCT.size).reshape(ny, nx, 2 * circuits + 2)
+        return cls((x_min, x_max, y_min, y_max), values)
+
+    @property
+    def shape(self):
+        """The number of grid points along y and x."""
+
+        return self._ny, self._nx
+
+    @property
+    def circuits(self):
+        """The number of circuits whose magnetic signatures are tabulated."""
+
+        return self._circuits
+
+    def contains(self, x, y):
+        """Return True if the point (*x*, *y*) is covered by the grid."""
+
+        return self._x_min <= x <= self._x_max and self._y_min <= y <= self._y_max
+
+    def interpolate(self, x, y, n):
+        """
+        Bilinearly interpolate the magnetic signature of circuit *n* and the
+        current at the point (*x*, *y*), which must be covered by the grid.
+
+        Returns:
+            beta, gamma, x_current, y_current
+        """
+
+        fx = (x - self._x_min) / self._dx
+        fy = (y - self._y_min) / self._dy
+        i = min(int(floor(fx)), self._nx - 2)
+        j = min(int(floor(fy)), self._ny - 2)
+        tx, ty = fx - i, fy - j
+
+        row0, row1 = self._rows[j], self._rows[j + 1]
+        v00, v01, v10, v11 = row0[i], row0[i + 1], row1[i], row1[i + 1]
+
+        result = []
+        for c in (2 * n, 2 * n + 1, -2, -1):
+            bottom = v00[c] + (v01[c] - v00[c]) * tx
+            top = v10[c] + (v11[c] - v10[c]) * tx
+            result.append(bottom + (top - bottom) * ty)
+        return tuple(result)
+
+    def max_current_error(self, current):
+        """
+        Return the largest error (mm/s) in the interpolated current, at the
+        centers of the grid cells, where it is the largest.
+        """
+
+        x = self._x_min + (np.arange(self._nx - 1) + 0.5) * self._dx
+        y = self._y_min + (np.arange(self._ny - 1) + 0.5) * self._dy
+        x, y = np.meshgrid(x, y)
+        exact_x, exact_y = current.calculate(x, y)
+
+        grid = self._values[..., -2:].astype(float)
+        interpolated = (grid[:-1, :-1] + grid[:-1, 1:] + grid[1:, :-1] + grid[1:, 1:]) / 4
+        return float(np.max(np.hypot(interpolated[..., 0] - exact_x, interpolated[..., 1] - exact_y)))
@@ -4,9 +4,10 @@ for making navigation decisions.
 """
 
 from collections import deque
+from math import hypot
 import numpy as np
 
-from atlantic_signatures.calculate import Current, Field, normalize
+from atlantic_signatures.calculate import Current, Field, Noise, normalize, normalize_xy
 
 
 class FinalGoalReached(Exception):
@@ -21,7 +22,7 @@ class Navigator:
     TODO
     """
 
-    def __init__(self, linear_velocity, goals, r_goal, r_multi, multimodal_method, secular_variation_strategy, circuits, field, current):
+    def __init__(self, linear_velocity, goals, r_goal, r_multi, multimodal_method, secular_variation_strategy, circuits, field, current, multimodal_resolution=None, lookup_table=None, noise=None, verbose=True):
         """Initialize a new Navigator."""
 
         self._linear_velocity = linear_velocity
@@ -30,11 +31,16 @@ class Navigator:
         self._r_goal = r_goal
         self._r_multi = r_multi
         self._multimodal_method = multimodal_method
+        self._multimodal_resolution = multimodal_resolution
+        self._grid_search_resolution = 360 if multimodal_resolution is None else multimodal_resolution  # affects angular resolution
         self._secular_variation_strategy = secular_variation_strategy
         self._circuits = circuits
+        self._verbose = verbose
 
         self._field_calculator = field
         self._current_calculator = current
+        self._lookup_table = lookup_table
+        self._noise = noise if noise is not None and noise.enabled else None  # measurement noise of the sensed magnetic signatures
 
         # precompute magnetic signatures for all goals
         self._magnetic_signatures = deque([])
@@ -46,8 +52,6 @@ class Navigator:
         self._current_circuit_number = 0
         self._update_goal()
 
-        self.net_velocity = np.vectorize(self._point_net_velocity, excluded=['self'])
-
     @property
     def current_goal_number(self):
         """
@@ -56,6 +60,20 @@ class Navigator:
 
         return 1 + (self._current_goal_number-1) % self._goal_count
 
+    @property
+    def lookup_table(self):
+        """
+        The :class:`LookupTable <atlantic_signatures.lookup_table.LookupTable>`
+        interpolated by point-wise evaluations outside r_multi, or None to
+        always evaluate the magnetic field and current exactly.
+        """
+
+        return self._lookup_table
+
+    @lookup_table.setter
+    def lookup_table(self, lookup_table):
+        self._lookup_table = lookup_table
+
     def check_reached_goal(self, x, y):
         """
         TODO
@@ -64,12 +82,13 @@ class Navigator:
         d_goal = np.linalg.norm([self._x_goal - x, self._y_goal - y])
 
         if d_goal <= self._r_goal:
-            print()
-            if self._circuits == 1:
-                print(f'Reached goal {self.current_goal_number} of {self._goal_count}')
-            else:
-                print(f'Reached goal {self.current_goal_number} of {self._goal_count} (circuit {self._current_circuit_number} of {self._circuits})')
-            print()
+            if self._verbose:
+                print()
+                if self._circuits == 1:
+                    print(f'Reached goal {self.current_goal_number} of {self._goal_count}')
+                else:
+                    print(f'Reached goal {self.current_goal_number} of {self._goal_count} (circuit {self._current_circuit_number} of {self._circuits})')
+                print()
             self._update_goal()
             return True
         else:
@@ -107,7 +126,8 @@ class Navigator:
             self._current_circuit_number += 1
 
         if not self._goals or self._current_circuit_number > self._circuits:
-            print('We have reached all goals...')
+            if self._verbose:
+                print('We have reached all goals...')
             raise FinalGoalReached
 
         self._x_goal, self._y_goal = self._goals.popleft()
@@ -116,72 +136,229 @@ class Navigator:
         self._beta_goal, self._gamma_goal = self._magnetic_signatures.popleft()
         self._magnetic_signatures.append((self._beta_goal, self._gamma_goal))  # add the goal's magnetic signature to the back of the queue
 
-    def _point_net_velocity(self, x, y):
+    def net_velocity(self, x, y):
         """
-        TODO
+        Calculate the net velocity (agent velocity plus ocean current) at one
+        or more points.
+
+        Scalar coordinates are evaluated point-wise, exactly as on the robot's
+        per-step call. Array coordinates are evaluated for the whole array at
+        once, using boolean masks to select the multimodal and beta/gamma
+        gradient branches.
+
+        Arguments:
+            x : float or array_like
+                The x-coordinate(s) of a point or array of points
+            y : float or array_like
+                The y-coordinate(s) of a point or array of points
+
+        Returns:
+            v_x : float or array_like
+                The x-component(s) of the net velocity at each point
+            v_y : float or array_like
+                The y-component(s) of the net velocity at each point
         """
 
-        x_diff, y_diff = self._x_goal - x, self._y_goal - y
-        d_goal = np.linalg.norm([x_diff, y_diff])
+        if np.ndim(x) == 0 and np.ndim(y) == 0:
+            return self._point_net_velocity(x, y)
+        return self._array_net_velocity(x, y)
+
+    def _array_net_velocity(self, x, y, goal=None, signature=None, n=None):
+        """
+        Vectorized counterpart of :meth:`_point_net_velocity` for arrays of
+        points.
+
+        By default every point navigates to the current goal, using its cached
+        magnetic signature and the current circuit's magnetic field. Any of
+        *goal* (x_goal, y_goal), *signature* (beta_goal, gamma_goal) and *n*
+        (the 0-indexed circuit number) may instead be given per point, as
+        arrays broadcastable to *x* and *y*, so that agents navigating to
+        different goals can be evaluated at once.
+        """
+
+        if goal is None:
+            goal = (self._x_goal, self._y_goal)
+        if signature is None:
+            signature = (self._beta_goal, self._gamma_goal)
+        if n is None:
+            n = self._current_circuit_number-1
+
+        x, y = np.asarray(x, dtype=float), np.asarray(y, dtype=float)
+        x, y, x_goal, y_goal, beta_goal, gamma_goal, n = np.broadcast_arrays(x, y, *goal, *signature, n)
+
+        x_diff, y_diff = x_goal - x, y_goal - y
+        d_goal = np.hypot(x_diff, y_diff)
 
         # Current is in units mm/s
         x_current, y_current = self._current_calculator.calculate(x, y)
 
-        if d_goal <= self._r_multi:
-            possible_methods = ['direct', 'optimized_grid_search']
+        dx, dy = np.empty_like(x), np.empty_like(y)
+
+        multi = d_goal <= self._r_multi
+        if multi.any():
+            possible_methods = ['direct', 'optimized_grid_search', 'analytic']
 
             match self._multimodal_method:
                 case 'direct':
                     # DIRECT PATHING METHOD
-                    dx, dy = normalize([x_diff, y_diff])
-                    return (self._linear_velocity * dx + x_current, self._linear_velocity * dy + y_current)
+                    dx[multi], dy[multi] = normalize_xy(x_diff[multi], y_diff[multi])
 
                 case 'optimized_grid_search':
                     # OPTIMIZED PATHING METHOD VIA GRID SEARCH
-                    c = np.array([x_current, y_current])  # ocean current vector
-                    d = np.array([x_diff, y_diff])  # vector from agent to goal
+                    dx[multi], dy[multi] = self._grid_search_heading(
+                        x_current[multi], y_current[multi], x_diff[multi], y_diff[multi], num_points=self._grid_search_resolution)
+
+                case 'analytic':
+                    # OPTIMIZED PATHING METHOD VIA CLOSED-FORM SOLUTION
+                    dx[multi], dy[multi] = self._analytic_heading(
+                        x_current[multi], y_current[multi], x_diff[multi], y_diff[multi], num_points=self._multimodal_resolution)
 
-                    def objective(u, c, d):
-                        # given a hypothetical unit vector u, compute the agent's net
-                        # velocity if it tried to travel in that direction
-                        v_net = self._linear_velocity * u + c
+                case _:
+                    raise ValueError(f"unrecognized multimodal pathing method: '{self._multimodal_method}', valid options: {possible_methods}")
+
+        far = ~multi
+        if far.any():
+            beta, gamma = self._field_calculator.calculate(x[far], y[far], n=n[far])
+            if self._noise is not None:
+                beta, gamma = self._noise.apply(beta, gamma)
+            dx[far], dy[far] = normalize_xy(beta_goal[far] - beta, gamma_goal[far] - gamma)
+
+        return (self._linear_velocity * dx + x_current, self._linear_velocity * dy + y_current)
 
-                        # return cos(theta) of the angle between the net velocity and the
-                        # vector to the goal, for maximization (thereby minimizing theta)
-                        return np.dot(v_net, d) / (np.linalg.norm(v_net) * np.linalg.norm(d))
+    def _grid_search_heading(self, x_current, y_current, x_diff, y_diff, num_points):
+        """
+        Find the optimal heading for each point by scoring a grid of
+        *num_points* unit vectors on the unit circle in one array operation.
+
+        For every point, the unit vector u maximizing cos(theta) of the angle
+        between the resulting net velocity (linear_velocity * u + current) and
+        the vector to the goal is returned. Ties resolve to the first candidate
+        on the grid, as in the point-wise search.
+        """
 
-                    def optimal_heading(c, d, num_points):
-                        best_objective = -np.inf
-                        optimal_u = None
+        # generate a grid of points on the unit circle
+        theta = np.linspace(-np.pi, np.pi, num_points)
+        u_x, u_y = np.cos(theta), np.sin(theta)
 
-                        # generate a grid of points on the unit circle
-                        theta = np.linspace(-np.pi, np.pi, num_points)
-                        unit_circle_points = np.vstack((np.cos(theta), np.sin(theta))).T
+        # net velocity for every (point, candidate) pair
+        x_net = self._linear_velocity * u_x + np.asarray(x_current)[..., np.newaxis]
+        y_net = self._linear_velocity * u_y + np.asarray(y_current)[..., np.newaxis]
+        x_diff = np.asarray(x_diff)[..., np.newaxis]
+        y_diff = np.asarray(y_diff)[..., np.newaxis]
 
-                        # evaluate the objective function at each point
-                        for u in unit_circle_points:
-                            this_objective = objective(u, c, d)
-                            if this_objective > best_objective:
-                                best_objective = this_objective
-                                optimal_u = u
+        objective = (x_net * x_diff + y_net * y_diff) / (np.hypot(x_net, y_net) * np.hypot(x_diff, y_diff))
+        best = np.argmax(objective, axis=-1)
 
-                        return optimal_u
+        return u_x[best], u_y[best]
+
+    def _analytic_heading(self, x_current, y_current, x_diff, y_diff, num_points=None):
+        """
+        Find the optimal heading for each point in closed form.
+
+        The net velocities reachable by the agent lie on a circle of radius
+        linear_velocity centered on the current vector c. If the component of c
+        perpendicular to the goal direction d can be cancelled while still
+        making progress toward the goal, the heading that points the net
+        velocity exactly at the goal is returned (cos(theta) = 1). Otherwise,
+        the best achievable net velocity is tangent to that circle, on the side
+        closest to d.
+
+        If *num_points* is given, the heading angle is snapped to the nearest
+        of the *num_points* candidates used by :meth:`_grid_search_heading`.
+        """
+
+        v = self._linear_velocity
+        c_x, c_y = np.asarray(x_current, dtype=float), np.asarray(y_current, dtype=float)
+
+        # decompose the current into components parallel and perpendicular to d
+        d_x, d_y = normalize_xy(x_diff, y_diff)
+        n_x, n_y = -d_y, d_x
+        c_par = c_x * d_x + c_y * d_y
+        c_perp = c_x * n_x + c_y * n_y
+
+        # cancel the perpendicular component of the current, if possible
+        u_perp = np.clip(-c_perp / v, -1, 1)
+        u_par = np.sqrt(1 - u_perp**2)
+        u_x = u_par * d_x + u_perp * n_x
+        u_y = u_par * d_y + u_perp * n_y
+        reachable = (np.abs(c_perp) <= v) & (c_par + v * u_par > 0)
+
+        # otherwise, the net velocity is tangent to the circle of reachable
+        # velocities, on whichever side is closer to the goal direction
+        c_norm = np.hypot(c_x, c_y)
+        safe_c_norm = np.where(c_norm == 0, 1, c_norm)
+        alpha = np.arcsin(np.clip(v / safe_c_norm, -1, 1))
+        side = np.where(c_perp < 0, 1, -1)  # rotate c toward d
+        t_angle = np.arctan2(c_y, c_x) + side * alpha
+        t_x = c_norm * np.cos(alpha) * np.cos(t_angle)
+        t_y = c_norm * np.cos(alpha) * np.sin(t_angle)
+        u_x = np.where(reachable, u_x, (t_x - c_x) / v)
+        u_y = np.where(reachable, u_y, (t_y - c_y) / v)
+
+        if num_points is not None:
+            # snap to the grid of candidate headings on [-pi, pi]
+            step = 2 * np.pi / (num_points - 1)
+            heading = np.round((np.arctan2(u_y, u_x) + np.pi) / step) * step - np.pi
+            u_x, u_y = np.cos(heading), np.sin(heading)
+
+        return u_x, u_y
+
+    def _point_net_velocity(self, x, y):
+        """
+        TODO
+        """
+
+        x_diff, y_diff = self._x_goal - x, self._y_goal - y
+        d_goal = hypot(x_diff, y_diff)
+        n = self._current_circuit_number-1
+
+        table = self._lookup_table
+        if d_goal > self._r_multi and table is not None and n < table.circuits and table.contains(x, y):
+            # FAST PATH
+            # interpolate the precomputed magnetic signature and current
+            beta, gamma, x_current, y_current = table.interpolate(x, y, n)
+            if self._noise is not None:
+                beta, gamma = self._noise.apply(beta, gamma)
+            beta_diff, gamma_diff = self._beta_goal - beta, self._gamma_goal - gamma
+            norm = hypot(beta_diff, gamma_diff) or 1.0
+            dx, dy = beta_diff / norm, gamma_diff / norm
+            return (self._linear_velocity * dx + x_current, self._linear_velocity * dy + y_current)
+
+        # Current is in units mm/s
+        x_current, y_current = self._current_calculator.calculate(x, y)
+
+        if d_goal <= self._r_multi:
+            possible_methods = ['direct', 'optimized_grid_search', 'analytic']
+
+            match self._multimodal_method:
+                case 'direct':
+                    # DIRECT PATHING METHOD
+                    dx, dy = normalize([x_diff, y_diff])
+                    return (self._linear_velocity * dx + x_current, self._linear_velocity * dy + y_current)
+
+                case 'optimized_grid_search':
+                    # OPTIMIZED PATHING METHOD VIA GRID SEARCH
+                    dx, dy = self._grid_search_heading(x_current, y_current, x_diff, y_diff, num_points=self._grid_search_resolution)
+                    return (self._linear_velocity * dx + x_current, self._linear_velocity * dy + y_current)
 
-                    num_points = 360  # affects angular resolution
-                    dx, dy = optimal_heading(c, d, num_points)
+                case 'analytic':
+                    # OPTIMIZED PATHING METHOD VIA CLOSED-FORM SOLUTION
+                    dx, dy = self._analytic_heading(x_current, y_current, x_diff, y_diff, num_points=self._multimodal_resolution)
                     return (self._linear_velocity * dx + x_current, self._linear_velocity * dy + y_current)
 
                 case _:
                     raise ValueError(f"unrecognized multimodal pathing method: '{self._multimodal_method}', valid options: {possible_methods}")
 
         else:
-            beta, gamma = self._field_calculator.calculate(x, y, n=self._current_circuit_number-1)
+            beta, gamma = self._field_calculator.calculate(x, y, n=n)
+            if self._noise is not None:
+                beta, gamma = self._noise.apply(beta, gamma)
             dx, dy = normalize([self._beta_goal - beta, self._gamma_goal - gamma])
 
             return (self._linear_velocity * dx + x_current, self._linear_velocity * dy + y_current)
 
     @classmethod
-    def from_cache(cls, cache):
+    def from_cache(cls, cache, lookup_table=None, rng=None, verbose=True):
         """
         TODO
         """
@@ -194,8 +371,12 @@ class Navigator:
             r_goal=cache['Create Properties']['r_goal'],
             r_multi=cache['Create Properties']['r_multi'],
             multimodal_method=cache['Create Properties']['multimodal_method'],
+            multimodal_resolution=cache['Create Properties'].get('multimodal_resolution'),
             secular_variation_strategy=cache['Create Properties']['secular_variation_strategy'],
             circuits=circuits,
             field=Field.from_cache(cache),
             current=Current.from_cache(cache),
+            lookup_table=lookup_table,
+            noise=Noise.from_cache(cache, rng=rng),
+            verbose=verbose,
             )
@@ -13,6 +13,7 @@ import numpy as np
 from ..plotter import colors
 from ..config_loader import Loader, config_to_dict
 from ..navigator import Navigator, FinalGoalReached
+from ..run_file import read_trajectory
 
 #plt.rcParams['animation.ffmpeg_path'] = os.path.join(os.expan)
 
@@ -147,9 +148,17 @@ class Plot:
         TODO
         """
 
-        self.cache = config_to_dict(Loader().read_config_file(config_file))
-        a = np.loadtxt(csv_file, skiprows=1, delimiter=',', unpack=True)
-        X, Y, THETA, TIME = a
+        # run files and .npy files are memory-mapped, so that animations only
+        # read the data points they draw
+        config_text, (X, Y, THETA, TIME) = read_trajectory(csv_file)
+        if config_file is not None:
+            config = Loader().read_config_file(config_file)
+        elif config_text is not None:
+            # run files embed the config they were made with
+            config = Loader().read_config_string(config_text)
+        else:
+            raise RuntimeError('No config file was provided')
+        self.cache = config_to_dict(config)
         self.X, self.Y, self.THETA, self.T = X, Y, THETA, TIME
         self.data = (X, Y, TIME)
         self.t0 = TIME[0]
@@ -273,6 +282,14 @@ class AnimatedPlot(Plot):
         for i in range(1, self.navigator._goal_count + 1):  # goal numbers are 1-indexed
             self.active_magnetic_signature_paths[i] = []
 
+        # precompute where each goal's original magnetic signature, before any time-varying field changes, moves to in every circuit
+        _goals = self.cache['Goal Properties'].copy()
+        _circuits = _goals.pop('circuits', 1)  # default circuits given here
+        x_goals, y_goals = np.array(list(_goals.values()), dtype=float).T
+        beta_original, gamma_original = self.navigator._field_calculator.calculate(x_goals, y_goals, n=0)
+        mag_sig_x, mag_sig_y = self.navigator._field_calculator.inverse_circuits(beta_original, gamma_original, n=np.arange(_circuits))
+        self.magnetic_signature_drift = np.stack([mag_sig_x / 1000, mag_sig_y / 1000], axis=-1)  # convert mm to m, indexed by circuit and goal
+
     def plot_data(self):
         """
         TODO
@@ -317,6 +334,7 @@ class AnimatedPlot(Plot):
         self._last_frame = -1
         self._current_circuit_number = 1  # start at 1 so that initial field is not plotted twice
         self._current_circuit_starting_point = 0
+        self._previous_circuits_end = None
         self.anim = FuncAnimation(self.fig, self.update_animation, frames=frames)
 
     def update_animation(self, i):
@@ -356,14 +374,9 @@ class AnimatedPlot(Plot):
                 # store the location of the original magnetic signature associated with the currently active goal, if it is new
                 # - the location will remain unchanged if time-varying magnetic fields are not used
                 if len(self.active_magnetic_signature_paths[self.navigator.current_goal_number]) < self.navigator._current_circuit_number:
-                    # retrieve this goal's original magnetic signature, before any time-varying field changes
-                    beta_original, gamma_original = self.navigator._field_calculator.calculate(self.navigator._x_goal, self.navigator._y_goal, n=0)
-
-                    # determine where that original magnetic signature has moved to in the current circuit
-                    mag_sig_x, mag_sig_y = self.navigator._field_calculator.inverse(beta_original, gamma_original, n=self.navigator._current_circuit_number-1)
-
-                    # store the displaced location of the original magnetic signature so its path can be plotted
-                    self.active_magnetic_signature_paths[self.navigator.current_goal_number].append(np.array([mag_sig_x / 1000, mag_sig_y / 1000]))  # convert mm to m
+                    # store the displaced location of this goal's original magnetic signature in the current circuit so its path can be plotted
+                    self.active_magnetic_signature_paths[self.navigator.current_goal_number].append(
+                        self.magnetic_signature_drift[self.navigator._current_circuit_number-1, self.navigator.current_goal_number-1])
 
             except FinalGoalReached:
                 pass
@@ -373,8 +386,10 @@ class AnimatedPlot(Plot):
         dx_current, dy_current = self.navigator._current_calculator.calculate(self.X[i], self.Y[i])  # keep units in mm for Navigator
         dx_agent, dy_agent = dx_net - dx_current, dy_net - dy_current
 
-        # update the trajectory of all previous circuits (transparent line)
-        self.trajectory_previous_circuits.set_data(self.X[:self._current_circuit_starting_point+1] / 1000, self.Y[:self._current_circuit_starting_point+1] / 1000)  # convert mm to m
+        # update the trajectory of all previous circuits (transparent line), which only changes when a circuit starts
+        if self._previous_circuits_end != self._current_circuit_starting_point:
+            self._previous_circuits_end = self._current_circuit_starting_point
+            self.trajectory_previous_circuits.set_data(self.X[:self._current_circuit_starting_point+1] / 1000, self.Y[:self._current_circuit_starting_point+1] / 1000)  # convert mm to m
 
         # update the trajectory of the current circuit (opaque line)
         self.trajectory_this_circuit.set_data(self.X[self._current_circuit_starting_point:i+1] / 1000, self.Y[self._current_circuit_starting_point:i+1] / 1000)  # convert mm to m
@@ -447,9 +462,7 @@ if __name__ == '__main__':
 
     import argparse
     import glob
-    import re
     from pathlib import Path
-    import tempfile
     import os.path
 
     parser = argparse.ArgumentParser(description='Generate plots of an experiment')
@@ -461,6 +474,7 @@ if __name__ == '__main__':
         choices=['all', 'static', 'animated'],
         help='The type of plot to generate (default: all)',
     )
+    parser.add_argument('--file', '-f', dest='config_file', help='The config file of the experiment, overriding the one embedded in the input file (required for .npy files of x, y, theta and time)')
     args = parser.parse_args()
 
     files = []
@@ -471,39 +485,20 @@ if __name__ == '__main__':
         file = Path(file)
         print(f'Reading "{file}"')
 
-        with (open(file, 'r', buffering=1) as input_file,
-              tempfile.TemporaryFile(mode='w', delete_on_close=False) as config_file,
-              tempfile.TemporaryFile(mode='w', delete_on_close=False) as csv_file):
-
-            # walk through the input file to where the CSV content starts,
-            # copying what comes before into a temporary config file, and what
-            # comes after into a temporary CSV file
-            CSV_HEADER_RE = re.compile(r'([a-zA-Z]+\s\([a-zA-Z]+\)\s*,*\s*)+')
-            csv_header_found = False
-            for line in input_file:
-                if not csv_header_found:
-                    csv_header_found = (CSV_HEADER_RE.match(line) is not None)
-                if not csv_header_found:
-                    config_file.write(line)
-                else:
-                    csv_file.write(line)
-
-            # close the temp files so that they can be read by AnimatedPlot
-            config_file.close()
-            csv_file.close()
-
-            if args.plot_type in ['all', 'static']:
-                print(f'Plotting "{file}"')
-                fig = Plot(config_file.name, csv_file.name)
-                out_file = str(file.parent / (file.stem + '.png'))
-                fig.save(out_file)
-                print(f'Saved "{out_file}"')
-
-            if args.plot_type in ['all', 'animated']:
-                print(f'Animating "{file}"')
-                anim = AnimatedPlot(config_file.name, csv_file.name, t_multi=10)
-                out_file = str(file.parent / (file.stem + '.gif'))
-                anim.save(out_file, fps=10)
-                print(f'Saved "{out_file}"')
+        # run files and CSV files embed their config, which the plotters read
+        # along with the data; .npy files need --file
+        if args.plot_type in ['all', 'static']:
+            print(f'Plotting "{file}"')
+            fig = Plot(args.config_file, file)
+            out_file = str(file.parent / (file.stem + '.png'))
+            fig.save(out_file)
+            print(f'Saved "{out_file}"')
+
+        if args.plot_type in ['all', 'animated']:
+            print(f'Animating "{file}"')
+            anim = AnimatedPlot(args.config_file, file, t_multi=10)
+            out_file = str(file.parent / (file.stem + '.gif'))
+            anim.save(out_file, fps=10)
+            print(f'Saved "{out_file}"')
 
         print()
@@ -0,0 +1,153 @@
+"""
+The :mod:`atlantic_signatures.prediction` module implements latency
+compensation of the poses received by the client.
+
+Poses are stale by the time they are acted on: by the Vicon system's own
+latency, the network and the client's processing. A :class:`PosePredictor`
+extrapolates each pose from its capture time, as stamped by the host, to the
+time it is acted on, using the history of drive commands sent to the Create.
+It also keeps track of the measured end-to-end latency.
+
+The host and client clocks are assumed to be synchronized (e.g. by NTP).
+"""
+
+from collections import deque
+from math import cos, inf, pi, sin
+
+
+# Turn radii of the DRIVE command with special meanings
+_STRAIGHT = ('straight', 32767, -32768)
+_ROTATE_CW = ('rotate_cw', -1)
+_ROTATE_CCW = ('rotate_ccw', 1)
+
+
+def advance_pose(x, y, theta, v, w, dt):
+    """
+    Return the pose reached from (*x*, *y*, *theta*) after moving for *dt*
+    seconds at linear velocity *v* (mm/s) and angular velocity *w* (rad/s).
+    """
+
+    if abs(w) < 1e-12:
+        return x + v * cos(theta) * dt, y + v * sin(theta) * dt, theta
+
+    theta_end = theta + w * dt
+    x += v / w * (sin(theta_end) - sin(theta))
+    y -= v / w * (cos(theta_end) - cos(theta))
+    return x, y, (theta_end + pi) % (2 * pi) - pi
+
+
+class PosePredictor:
+    """
+    Predicts the current pose of the Create from a stale one.
+
+    Parameters:
+        horizon : float
+            The maximum number of seconds a pose is extrapolated by. Poses are
+            not extrapolated if it is 0, but the latency is still measured.
+        shaft_length : float
+            The distance between the Create's wheels (mm)
+    """
+
+    def __init__(self, horizon, shaft_length):
+        """Initializer for a new PosePredictor."""
+
+        self._horizon = horizon
+        self._shaft_length = shaft_length
+
+        # (time, linear velocity, angular velocity) of each drive command,
+        # oldest first
+        self._commands = deque([(-inf, 0.0, 0.0)])
+
+        self.latency_count = 0
+        self.last_latency = None
+        self.mean_latency = None
+        self.max_latency = None
+        self.dropped_frames = 0
+        self._frame_number = None
+
+    @property
+    def horizon(self):
+        """The maximum number of seconds a pose is extrapolated by."""
+
+        return self._horizon
+
+    def velocities(self, v, r):
+        """
+        Return the linear (mm/s) and angular (rad/s) velocities of a DRIVE
+        command with speed *v* (mm/s) and turn radius *r* (mm).
+        """
+
+        if r in _STRAIGHT:
+            return v, 0.0
+        if r in _ROTATE_CW:
+            return 0.0, -2 * v / self._shaft_length
+        if r in _ROTATE_CCW:
+            return 0.0, 2 * v / self._shaft_length
+        if r == 0:
+            # not a valid radius, modelled as driving straight rather than
+            # turning infinitely fast
+            return v, 0.0
+        return v, v / r
+
+    def command(self, t, v, r='straight'):
+        """
+        Record a drive command taking effect at time *t*. Any command recorded
+        to take effect later, e.g. a delayed stop, is superseded.
+        """
+
+        self._record(t, *self.velocities(v, r))
+
+    def command_wheels(self, t, vl, vr):
+        """
+        Record a DRIVE_DIRECT command, with left and right wheel speeds *vl*
+        and *vr* (mm/s), taking effect at time *t*.
+        """
+
+        self._record(t, (vl + vr) / 2, (vr - vl) / self._shaft_length)
+
+    def _record(self, t, v, w):
+        while len(self._commands) > 1 and self._commands[-1][0] >= t:
+            self._commands.pop()
+        self._commands.append((t, v, w))
+
+        # forget the commands that ended before the prediction window
+        while len(self._commands) > 2 and self._commands[1][0] < t - self._horizon:
+            self._commands.popleft()
+
+    def measure(self, frame_number, timestamp, now):
+        """
+        Record the end-to-end latency of a pose captured at *timestamp*, and
+        any frames skipped since the previous pose.
+        """
+
+        if self._frame_number is not None and frame_number > self._frame_number + 1:
+            self.dropped_frames += frame_number - self._frame_number - 1
+        self._frame_number = frame_number
+
+        latency = now - timestamp
+        self.latency_count += 1
+        self.last_latency = latency
+        if self.latency_count == 1:
+            self.mean_latency = self.max_latency = latency
+        else:
+            self.mean_latency += (latency - self.mean_latency) / self.latency_count
+            self.max_latency = max(self.max_latency, latency)
+        return latency
+
+    def predict(self, x, y, theta, timestamp, now):
+        """
+        Extrapolate the pose captured at *timestamp* to *now*, by at most the
+        horizon, along the commanded motion.
+        """
+
+        start = now - min(max(now - timestamp, 0.0), self._horizon)
+        if start >= now:
+            return x, y, theta
+
+        commands = list(self._commands)
+        for i, (t, v, w) in enumerate(commands):
+            end = commands[i + 1][0] if i + 1 < len(commands) else now
+            t, end = max(t, start), min(end, now)
+            if end > t:
+                x, y, theta = advance_pose(x, y, theta, v, w, end - t)
+        return x, y, theta
@@ -0,0 +1,423 @@
+"""
+The :mod:`atlantic_signatures.run_file` module implements a compact binary
+container for the trajectories logged by the :class:`Host
+<atlantic_signatures.host.Host>` and the :class:`Simulation
+<atlantic_signatures.simulation.Simulation>`, and a converter from the legacy
+config-prefixed CSV files.
+
+A run file consists of a short header followed by fixed-size records, so that
+records can be appended cheaply in chunks during the run, and a whole run is
+loaded or memory-mapped in one call, each column being a field of the record
+array:
+
+    ======== ============================================================
+    Field    Contents
+    ======== ============================================================
+    magic    ``b'ATSRUN\\x00\\x00'``
+    version  ``uint16``, the run file format version
+    length   ``uint32``, the length of the metadata
+    metadata UTF-8 encoded JSON: the config file text, and where the run
+             was logged, padded with spaces to a multiple of 8 bytes
+    records  :data:`RUN_DTYPE` records, one per logged pose
+    ======== ============================================================
+"""
+
+import atexit
+import io
+import json
+import re
+import struct
+import threading
+import time
+
+import numpy as np
+
+
+RUN_MAGIC = b'ATSRUN\x00\x00'
+RUN_VERSION = 1
+RUN_SUFFIX = '.run'
+HEADER_STRUCT = struct.Struct('<8sHI')
+
+# One record per logged pose, little-endian and unpadded
+RUN_DTYPE = np.dtype([
+    ('time', '<f8'),    # seconds since the start of the run
+    ('frame', '<u8'),   # the Vicon frame number, 0 if unknown
+    ('x', '<f8'),       # position (mm)
+    ('y', '<f8'),
+    ('theta', '<f8'),   # heading (rad)
+    ('v_x', '<f8'),     # net velocity commanded when the pose was logged (mm/s), NaN if unknown
+    ('v_y', '<f8'),
+    ('goal', '<u2'),    # the (1-indexed) goal navigated to, 0 if unknown
+    ])
+
+# Number of records buffered by a RunWriter before they are written
+CHUNK_SIZE = 1024
+
+# Number of seconds between the writes of a RunLogger
+FLUSH_INTERVAL = 1.0
+
+# Number of bytes of CSV text parsed at a time
+CSV_CHUNK_SIZE = 1 << 22
+
+# The columns of the legacy CSV files, and of trajectories in .npy files
+TRAJECTORY_COLUMNS = ('x', 'y', 'theta', 'time')
+
+# The header line of the data in legacy CSV files, e.g.
+# 'X (mm),\tY (mm),\tTheta (rad),\tTime (sec)'
+CSV_HEADER_RE = re.compile(rb'^([a-zA-Z]+\s\([a-zA-Z]+\)\s*,*\s*)+$', re.MULTILINE)
+
+
+class RunFileError(Exception):
+    """Raised when a run file or legacy CSV file can't be read."""
+
+
+class RunWriter:
+    """
+    Writes a run file, record by record.
+
+    Records are buffered in a preallocated chunk, which is written when full,
+    when :meth:`flush` is called and when the writer is closed.
+
+    Example usage:
+        >>> from atlantic_signatures.run_file import RunWriter, read_run
+        >>> with RunWriter('Test-1.run', config_text, source='host') as writer:
+        ...     writer.append(0.0, -1000.0, -1500.0, 0.0, frame=1)
+        >>> metadata, records = read_run('Test-1.run')
+        >>> records['x']
+        array([-1000.])
+
+    Parameters:
+        fname : str
+            The run file to write
+        config_text : str
+            The text of the config file the run was made with
+        **metadata
+            Further JSON-serializable metadata, e.g. where the run was logged
+    """
+
+    def __init__(self, fname, config_text, **metadata):
+        """Initializer for a new RunWriter."""
+
+        self._file = open(fname, 'wb')
+        self._chunk = np.zeros(CHUNK_SIZE, dtype=RUN_DTYPE)
+        self._count = 0
+
+        metadata = {'version': RUN_VERSION, 'created': time.time(), **metadata, 'config': config_text}
+        metadata = json.dumps(metadata).encode('utf-8')
+        metadata += b' ' * (-(HEADER_STRUCT.size + len(metadata)) % 8)  # align the records
+        self._file.write(HEADER_STRUCT.pack(RUN_MAGIC, RUN_VERSION, len(metadata)))
+        self._file.write(metadata)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    @property
+    def name(self):
+        """The name of the run file."""
+
+        return self._file.name
+
+    @property
+    def closed(self):
+        """Whether the run file has been closed."""
+
+        return self._file.closed
+
+    def append(self, t, x, y, theta, frame=0, v_x=np.nan, v_y=np.nan, goal=0):
+        """Append the record of a pose logged *t* seconds into the run."""
+
+        self._chunk[self._count] = (t, frame, x, y, theta, v_x, v_y, goal)
+        self._count += 1
+        if self._count == CHUNK_SIZE:
+            self.flush()
+
+    def extend(self, records):
+        """Append an array of :data:`RUN_DTYPE` records."""
+
+        self.flush()
+        self._file.write(np.asarray(records, dtype=RUN_DTYPE).tobytes())
+
+    def flush(self):
+        """Write the buffered records."""
+
+        if self._count:
+            self._file.write(self._chunk[:self._count].tobytes())
+            self._count = 0
+        self._file.flush()
+
+    def close(self):
+        """Write the buffered records and close the run file."""
+
+        if self._file.closed:
+            return
+        self.flush()
+        self._file.close()
+
+
+class RunLogger(RunWriter):
+    """
+    Writes a run file from a background thread.
+
+    :meth:`append` only copies the record into a preallocated chunk, so that a
+    real-time control loop never formats or writes data. Full chunks, and the
+    records of the current chunk, are written by a background thread every
+    *flush_interval* seconds. The remaining records are written when the
+    logger is closed, or at the latest when the interpreter exits, so at most
+    *flush_interval* seconds of records are lost if the process is killed.
+
+    Parameters:
+        fname : str
+            The run file to write
+        config_text : str
+            The text of the config file the run was made with
+        flush_interval : float
+            The number of seconds between writes
+        **metadata
+            Further JSON-serializable metadata, e.g. where the run was logged
+    """
+
+    def __init__(self, fname, config_text, flush_interval=FLUSH_INTERVAL, **metadata):
+        """Initializer for a new RunLogger."""
+
+        super().__init__(fname, config_text, **metadata)
+        self._flush_interval = flush_interval
+        self._full_chunks = []  # chunks waiting to be written
+        self._spare_chunks = []  # written chunks, to be reused
+        self._error = None  # raised by the background thread
+
+        # _lock guards the chunks; _write_lock keeps the writes in order
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._stopped = threading.Event()
+
+        self._thread = threading.Thread(target=self._flush_loop, name='RunLogger', daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def _flush_loop(self):
+        while not self._stopped.wait(self._flush_interval):
+            try:
+                self.flush()
+            except Exception as err:
+                self._error = err
+                return
+
+    def append(self, t, x, y, theta, frame=0, v_x=np.nan, v_y=np.nan, goal=0):
+        """Append the record of a pose logged *t* seconds into the run."""
+
+        with self._lock:
+            self._chunk[self._count] = (t, frame, x, y, theta, v_x, v_y, goal)
+            self._count += 1
+            if self._count == CHUNK_SIZE:
+                self._full_chunks.append(self._chunk)
+                self._chunk = self._spare_chunks.pop() if self._spare_chunks else np.zeros(CHUNK_SIZE, dtype=RUN_DTYPE)
+                self._count = 0
+
+    def extend(self, records):
+        """Append an array of :data:`RUN_DTYPE` records."""
+
+        with self._lock:
+            self._full_chunks.append(self._chunk[:self._count].copy())
+            self._full_chunks.append(np.array(records, dtype=RUN_DTYPE))
+            self._count = 0
+
+    def flush(self):
+        """Write the buffered records."""
+
+        with self._write_lock:
+            with self._lock:
+                chunks, self._full_chunks = self._full_chunks, []
+                if self._count:
+                    chunks.append(self._chunk[:self._count].copy())
+                    self._count = 0
+
+            for chunk in chunks:
+                self._file.write(chunk.tobytes())
+            self._file.flush()
+
+            with self._lock:
+                self._spare_chunks.extend(chunk for chunk in chunks if len(chunk) == CHUNK_SIZE)
+
+    def close(self):
+        """
+        Stop the background thread, write the buffered records and close the
+        run file.
+        """
+
+        if self._file.closed:
+            return
+        atexit.unregister(self.close)
+        self._stopped.set()
+        if self._thread is not threading.current_thread():
+            self._thread.join()
+        try:
+            self.flush()
+        finally:
+            self._file.close()
+        if self._error is not None:
+            raise self._error
+
+
+def _read_header(f, fname):
+    magic, version, length = HEADER_STRUCT.unpack(f.read(HEADER_STRUCT.size))
+    if magic != RUN_MAGIC:
+        raise RunFileError(f'{fname} is not a run file')
+    if version != RUN_VERSION:
+        raise RunFileError(f'Unsupported run file version: {version}')
+    return json.loads(f.read(length)), HEADER_STRUCT.size + length
+
+
+def read_run(fname, mmap=False):
+    """
+    Read a run file, returning its metadata and its records as an array of
+    :data:`RUN_DTYPE`. If *mmap* is True, the records are memory-mapped rather
+    than read, and only the pages of the fields that are accessed are loaded.
+    """
+
+    with open(fname, 'rb') as f:
+        metadata, offset = _read_header(f, fname)
+        if not mmap:
+            return metadata, np.fromfile(f, dtype=RUN_DTYPE)
+        count = (f.seek(0, io.SEEK_END) - offset) // RUN_DTYPE.itemsize
+
+    if count == 0:
+        # np.memmap can't map an empty region
+        return metadata, np.zeros(0, dtype=RUN_DTYPE)
+    return metadata, np.memmap(fname, dtype=RUN_DTYPE, mode='r', offset=offset, shape=(count,))
+
+
+def is_run_file(fname):
+    """Return True if *fname* is a run file, rather than a legacy CSV file."""
+
+    with open(fname, 'rb') as f:
+        return f.read(len(RUN_MAGIC)) == RUN_MAGIC
+
+
+def read_csv_columns(f, columns=len(TRAJECTORY_COLUMNS), head=b''):
+    """
+    Parse the comma-separated numbers of *head*, followed by those of the
+    binary file object *f* from its current position to its end, returning
+    an array with one row per line.
+
+    The text is parsed :data:`CSV_CHUNK_SIZE` bytes at a time, so that no more
+    than a chunk of it is held in memory.
+    """
+
+    blocks = []
+    tail = head
+    while True:
+        chunk = f.read(CSV_CHUNK_SIZE)
+        if not chunk:
+            break
+        chunk = tail + chunk
+        end = chunk.rfind(b'\n') + 1  # parse whole lines only
+        chunk, tail = chunk[:end], chunk[end:]
+        if chunk.strip():
+            blocks.append(np.loadtxt(io.BytesIO(chunk), delimiter=',', ndmin=2))
+    if tail.strip():
+        blocks.append(np.loadtxt(io.BytesIO(tail), delimiter=',', ndmin=2))
+
+    if not blocks:
+        return np.zeros((0, columns))
+    data = np.concatenate(blocks)
+    if data.shape[1] != columns:
+        raise RunFileError(f'Expected {columns} columns, not {data.shape[1]}')
+    return data
+
+
+def read_trajectory(fname):
+    """
+    Open the trajectory logged in *fname*, returning the text of the config
+    file it embeds (None if it has none), and its x, y, theta and time
+    columns.
+
+    *fname* can be:
+
+    - A run file, whose records are memory-mapped
+    - A .npy file, memory-mapped, holding either records with x, y, theta and
+      time fields, or an array of x, y, theta and time columns
+    - A CSV file of x, y, theta and time columns, optionally preceded by a
+      header line, or a legacy CSV file, which are read with :func:`read_csv`
+
+    Memory-mapped columns are only read from disk as they are accessed.
+    """
+
+    with open(fname, 'rb') as f:
+        magic = f.read(len(RUN_MAGIC))
+    if magic == RUN_MAGIC:
+        metadata, records = read_run(fname, mmap=True)
+        return metadata['config'], tuple(records[name] for name in TRAJECTORY_COLUMNS)
+    if magic.startswith(np.lib.format.MAGIC_PREFIX):
+        array = np.load(fname, mmap_mode='r')
+        if array.dtype.names is not None:
+            return None, tuple(array[name] for name in TRAJECTORY_COLUMNS)
+        return None, tuple(array[:, i] for i in range(len(TRAJECTORY_COLUMNS)))
+
+    config_text, data = read_csv(fname)
+    return config_text, tuple(data.T)
+
+
+def read_csv(fname):
+    """
+    Read a CSV file of x, y, theta and time columns, returning the text of the
+    config file that precedes them (None if there is none), and an array of
+    the columns.
+
+    The file is read in a single pass: the data header line of legacy CSV
+    files is searched for once, in the first chunk read, and the numbers that
+    follow it are parsed from that same chunk onwards. A file without a
+    legacy header may start with a header line of its own, which is skipped.
+    """
+
+    with open(fname, 'rb') as f:
+        head = f.read(CSV_CHUNK_SIZE)
+        config_text = None
+
+        first_line = head.split(b'\n', 1)[0]
+        try:
+            float(first_line.split(b',')[0])
+        except ValueError:
+            match = CSV_HEADER_RE.search(head)
+            if match is not None:
+                config_text = head[:match.start()].decode('utf-8') or None
+                head = head[match.end():]
+            else:
+                head = head[len(first_line):]  # skip the header line
+
+        return config_text, read_csv_columns(f, head=head)
+
+
+def read_legacy_csv(fname):
+    """
+    Read a legacy CSV file, made of the config file text followed by
+    comma-separated x, y, theta and time columns, returning the config text
+    and the data as an array of :data:`RUN_DTYPE`.
+    """
+
+    config_text, columns = read_csv(fname)
+    if config_text is None:
+        raise RunFileError(f'No config was found before the data header line of {fname}')
+
+    records = np.zeros(len(columns), dtype=RUN_DTYPE)
+    records['v_x'] = records['v_y'] = np.nan
+    for i, name in enumerate(TRAJECTORY_COLUMNS):
+        records[name] = columns[:, i]
+    return config_text, records
+
+
+def convert_legacy_csv(fname, run_fname=None):
+    """
+    Convert a legacy CSV file to a run file, by default named after it with
+    the :data:`RUN_SUFFIX`. Return the name of the run file.
+    """
+
+    if run_fname is None:
+        run_fname = re.sub(r'\.csv$', '', str(fname)) + RUN_SUFFIX
+
+    config_text, records = read_legacy_csv(fname)
+    with RunWriter(run_fname, config_text, source='legacy csv', converted_from=str(fname)) as writer:
+        writer.extend(records)
+    return run_fname
@@ -10,17 +10,28 @@ import numpy as np
 
 from atlantic_signatures.config_loader import config_to_dict, Loader
 from atlantic_signatures.navigator import Navigator, FinalGoalReached
+from atlantic_signatures.run_file import FLUSH_INTERVAL, RUN_SUFFIX, RunLogger
 from atlantic_signatures.socket_protocol import BreakLoop
 
 SIMS_DIR = os.path.join(os.getcwd(), 'simulations')
 
+# Simulated turns rotate the robot by this fraction of the heading error; the
+# small coefficient allows for angle_cutoff to have a more realistic effect
+TURN_GAIN = 0.1
+
+# Number of seconds the Client drives the Create during a turn
+TURN_DURATION = 0.1
+
+# Slowest forward speed (mm/s) requested by the Client
+MIN_SPEED = 11
+
 
 class Simulation:
     """
     TODO
     """
 
-    def __init__(self, x0, y0, theta0=0.0, config_file=None):
+    def __init__(self, x0, y0, theta0=0.0, config_file=None, flush_interval=FLUSH_INTERVAL):
         """Initializer for a new Simulation."""
 
         self.x0 = x0
@@ -30,6 +41,7 @@ class Simulation:
         self._new_pose = self._pose
         self._default_v = 100
         self._config = {}
+        self._command = (np.nan, np.nan)  # the last net velocity commanded
 
         if config_file is None:
             raise RuntimeError('No config file was provided')
@@ -45,10 +57,13 @@ class Simulation:
         sim_num = 1
 
         for file in os.listdir(SIMS_DIR):
-            if file.startswith('Simulation') and file.endswith('.csv'):
+            if file.startswith('Simulation') and file.endswith(('.csv', RUN_SUFFIX)):
                 sim_num += 1
 
-        self._data_file = open(os.path.join(SIMS_DIR, 'Simulation-%d.csv' % sim_num), 'w')
+        with open(config_file) as f:
+            config_text = f.read()
+        self._data_file = RunLogger(os.path.join(SIMS_DIR, 'Simulation-%d%s' % (sim_num, RUN_SUFFIX)), config_text,
+                                    flush_interval=flush_interval, source='simulation', config_file=config_file)
         self.start()
 
     def __repr__(self):
@@ -99,6 +114,8 @@ class Simulation:
             else:
                 raise
         finally:
+            self._data_file.close()
+
             # always cleanly close the socket
             # self._sock.close()  # REMOVED FOR SIMULATION
             print('Socket has been closed')
@@ -133,7 +150,8 @@ class Simulation:
             # break loop if the simulated robot leaves the arena
             self.send_data(level=10)
 
-        self._data_file.write(','.join(str(param) for param in data.values()) + ',%f\n' % (time.time() - self.t0))
+        self._data_file.append(time.time() - self.t0, data['x'], data['y'], data['theta'],
+                               v_x=self._command[0], v_y=self._command[1], goal=self._navigator.current_goal_number)
 
         try:
             # self._send(PACKETS.DATA, json.dumps(data).encode('utf-8'))
@@ -154,9 +172,6 @@ class Simulation:
                 print("{} - {} = {}".format(section, option, value))
 
         try:
-            with open(config_file) as f:
-                self._data_file.write(f.read() + '\n')
-                self._data_file.write('X (mm),\tY (mm),\tTheta (rad),\tTime (sec)\n')
             # self._send(PACKETS.CONFIG, json.dumps(config).encode('utf-8'))
             self.recv_config(json.dumps(config).encode('utf-8'))  # SIMPLIFIED FOR SIMULATION
         except:
@@ -221,6 +236,7 @@ class Simulation:
             # self.send_close()  # REMOVED FOR SIMULATION
             raise BreakLoop
         dx, dy = self._navigator.net_velocity(x, y)
+        self._command = (dx, dy)
         self.move_create(dx, dy)
 
     def move_create(self, vx, vy):
@@ -232,9 +248,9 @@ class Simulation:
 
         V = int(sqrt(vx**2 + vy**2))
 
-        if V < 11:
-            print(f'requested velocity too low, setting to min speed for Create: {V} -> 11')
-            V = 11
+        if V < MIN_SPEED:
+            print(f'requested velocity too low, setting to min speed for Create: {V} -> {MIN_SPEED}')
+            V = MIN_SPEED
 
         # Small epsilon added to vx to avoid division by zero
         if vx == 0:
@@ -253,7 +269,7 @@ class Simulation:
             # self._create._drive(max(turn_v, 30), r=r)
             # time.sleep(0.1)
             # self._create._drive(0)  # stop moving and wait for next command
-            self.simulate_turn(0.1 * delta)  # SIMPLIFIED FOR SIMULATION, small coefficient allows for angle_cutoff to have a more realistic effect
+            self.simulate_turn(TURN_GAIN * delta)  # SIMPLIFIED FOR SIMULATION, small coefficient allows for angle_cutoff to have a more realistic effect
                                              # TODO: figure out the exact speed and duration needed to perform a precise turn
 
         else:
@@ -282,3 +298,406 @@ class Simulation:
         self._new_pose = self._pose
         self._new_pose['x'] += distance * cos(self._pose['theta'])
         self._new_pose['y'] += distance * sin(self._pose['theta'])
+
+
+
+class SimulatedClock:
+    """
+    A deterministic stand-in for :func:`time.time`.
+
+    The clock only moves when it is advanced, so simulated runs produce the
+    same timestamps regardless of how fast the host machine is.
+    """
+
+    def __init__(self, t0=0.0):
+        """Initializer for a new SimulatedClock."""
+
+        self._t = t0
+
+    def time(self):
+        """Return the current simulated time in seconds."""
+
+        return self._t
+
+    def advance(self, dt):
+        """Move the simulated time forward by *dt* seconds."""
+
+        self._t += dt
+
+
+class Trajectory:
+    """
+    The result of a headless simulation run.
+
+    Attributes:
+        x, y : ndarray
+            The position of the robot at each step (mm)
+        theta : ndarray
+            The heading of the robot at each step (rad)
+        t : ndarray
+            The simulated time of each step (s)
+        goal : ndarray
+            The (1-indexed) goal being navigated to at each step
+        circuit : ndarray
+            The (1-indexed) circuit number at each step
+        outcome : str
+            How the run ended: 'finished' if all goals were reached,
+            'out_of_bounds' if the robot left the arena, or 'max_steps' if the
+            step limit was reached first
+    """
+
+    OUTCOMES = ('finished', 'out_of_bounds', 'max_steps')
+
+    def __init__(self, x, y, theta, t, goal, circuit, outcome):
+        """Initializer for a new Trajectory."""
+
+        self.x = x
+        self.y = y
+        self.theta = theta
+        self.t = t
+        self.goal = goal
+        self.circuit = circuit
+        self.outcome = outcome
+
+    def __len__(self):
+        return len(self.t)
+
+    def __repr__(self):
+        return f'{self.__class__.__name__}(steps={len(self)}, outcome={self.outcome!r})'
+
+
+class SimulationEngine:
+    """
+    A headless, in-process simulator.
+
+    Unlike :class:`Simulation`, the engine does not emulate the host/client
+    plumbing: poses are never serialized, nothing is printed or written to
+    disk, and time comes from a :class:`SimulatedClock` rather than
+    :func:`time.time`. The robot's kinematics are the same as those of
+    :meth:`Simulation.simulate_turn` and :meth:`Simulation.simulate_straight`.
+
+    Example usage:
+        >>> import importlib.resources
+        >>> config_file = importlib.resources.files('atlantic_signatures').joinpath('demo.cfg')
+        >>>
+        >>> from atlantic_signatures.config_loader import Loader, config_to_dict
+        >>> from atlantic_signatures.simulation import SimulationEngine
+        >>> config = config_to_dict(Loader().read_config_file(config_file))
+        >>> trajectory = SimulationEngine().run(0, -1500, 0, config)
+
+    Parameters:
+        max_steps : int
+            The maximum number of steps simulated before a run is abandoned
+        turn_duration : float
+            The simulated time taken by a turn (s); a straight move takes
+            agent_time_step
+    """
+
+    _INITIAL_CAPACITY = 1024
+
+    def __init__(self, max_steps=100000, turn_duration=TURN_DURATION):
+        """Initializer for a new SimulationEngine."""
+
+        self._max_steps = max_steps
+        self._turn_duration = turn_duration
+
+    def run(self, x0, y0, theta0, config, rng=None):
+        """Simulate one run from the pose (x0, y0, theta0).
+
+        Arguments:
+            x0, y0 : float
+                The initial position of the robot (mm)
+            theta0 : float
+                The initial heading of the robot (rad)
+            config : dict or str
+                A config dictionary as returned by
+                :func:`config_to_dict <atlantic_signatures.config_loader.config_to_dict>`,
+                or the path to a config file
+            rng : numpy.random.Generator
+                The random number generator of the run's measurement noise, by
+                default seeded from the config's Noise Properties
+
+        Returns:
+            trajectory : Trajectory
+                The recorded poses and the outcome of the run
+        """
+
+        if not isinstance(config, dict):
+            config = config_to_dict(Loader().read_config_file(config))
+
+        navigator = Navigator.from_cache(config, rng=rng, verbose=False)
+        clock = SimulatedClock()
+
+        time_step = config['Create Properties']['agent_time_step']
+        angle_cutoff = config['Create Properties']['angle_cutoff']
+        bounds = config['Boundary Conditions']
+        x_min, x_max = bounds['x_min'], bounds['x_max']
+        y_min, y_max = bounds['y_min'], bounds['y_max']
+
+        poses = np.empty((min(self._INITIAL_CAPACITY, self._max_steps), 4))
+        labels = np.empty((len(poses), 2), dtype=int)
+
+        x, y, theta = float(x0), float(y0), float(theta0)
+        outcome = 'max_steps'
+        n = 0
+        while n < self._max_steps:
+            if x < x_min or x > x_max or y < y_min or y > y_max:
+                outcome = 'out_of_bounds'
+                break
+
+            if n == len(poses):
+                poses = np.concatenate((poses, np.empty_like(poses)))
+                labels = np.concatenate((labels, np.empty_like(labels)))
+            poses[n] = x, y, theta, clock.time()
+            labels[n] = navigator.current_goal_number, navigator._current_circuit_number
+            n += 1
+
+            try:
+                navigator.check_reached_goal(x, y)
+            except FinalGoalReached:
+                outcome = 'finished'
+                break
+
+            vx, vy = navigator.net_velocity(x, y)
+            V = max(int(sqrt(vx**2 + vy**2)), MIN_SPEED)
+
+            # Small epsilon added to vx to avoid division by zero
+            if vx == 0:
+                vx = 1e-6
+
+            desired_angle = atan2(vy, vx)
+            delta = copysign(acos(cos(desired_angle - theta)), sin(desired_angle - theta))
+            if abs(delta) > angle_cutoff:
+                theta = (theta + TURN_GAIN * delta + np.pi) % (2*np.pi) - np.pi
+                clock.advance(self._turn_duration)
+            else:
+                x += time_step * V * cos(theta)
+                y += time_step * V * sin(theta)
+                clock.advance(time_step)
+
+        poses = poses[:n].copy()
+        labels = labels[:n].copy()
+        return Trajectory(*poses.T, *labels.T, outcome=outcome)
+
+
+class EnsembleTrajectory:
+    """
+    The result of a lockstep ensemble simulation of N agents.
+
+    Attributes:
+        x, y, theta, t : ndarray, shape (steps, N) or None
+            The pose and simulated time of every agent at each step, padded
+            with NaN once an agent has stopped (None if not recorded)
+        steps : ndarray, shape (N,)
+            The number of recorded steps of each agent
+        goal : ndarray, shape (N,)
+            The (1-indexed) goal each agent was navigating to when it stopped
+        circuit : ndarray, shape (N,)
+            The (1-indexed) circuit each agent was on when it stopped
+        finished : ndarray of bool, shape (N,)
+            Whether each agent reached all of its goals
+        out_of_bounds : ndarray of bool, shape (N,)
+            Whether each agent left the arena
+        final_x, final_y, final_theta, final_t : ndarray, shape (N,)
+            The last pose and simulated time of each agent
+    """
+
+    def __init__(self, x, y, theta, t, steps, goal, circuit, finished, out_of_bounds,
+                 final_x, final_y, final_theta, final_t):
+        """Initializer for a new EnsembleTrajectory."""
+
+        self.x = x
+        self.y = y
+        self.theta = theta
+        self.t = t
+        self.steps = steps
+        self.goal = goal
+        self.circuit = circuit
+        self.finished = finished
+        self.out_of_bounds = out_of_bounds
+        self.final_x = final_x
+        self.final_y = final_y
+        self.final_theta = final_theta
+        self.final_t = final_t
+
+    def __len__(self):
+        return len(self.steps)
+
+    def __repr__(self):
+        return (f'{self.__class__.__name__}(agents={len(self)}, finished={int(self.finished.sum())}, '
+                f'out_of_bounds={int(self.out_of_bounds.sum())})')
+
+    @property
+    def outcome(self):
+        """The outcome of each agent's run, as in :attr:`Trajectory.outcome`."""
+
+        return np.where(self.finished, 'finished', np.where(self.out_of_bounds, 'out_of_bounds', 'max_steps'))
+
+
+class EnsembleEngine:
+    """
+    A headless simulator stepping many agents in lockstep.
+
+    All agents share one config and are advanced together as NumPy arrays,
+    using the same turn/straight kinematics as :class:`SimulationEngine`.
+    Each agent keeps its own goal index, circuit number, magnetic signatures
+    (for the 'imprint' secular variation strategy) and simulated clock.
+    Agents stop once they reach their final goal or leave the arena.
+
+    Example usage:
+        >>> import importlib.resources
+        >>> config_file = importlib.resources.files('atlantic_signatures').joinpath('demo.cfg')
+        >>>
+        >>> import numpy as np
+        >>> from atlantic_signatures.config_loader import Loader, config_to_dict
+        >>> from atlantic_signatures.simulation import EnsembleEngine
+        >>> config = config_to_dict(Loader().read_config_file(config_file))
+        >>> x0, y0 = np.meshgrid(np.linspace(-2000, 2000, 10), np.linspace(-2000, 2000, 10))
+        >>> ensemble = EnsembleEngine().run(x0.ravel(), y0.ravel(), 0, config)
+
+    Parameters:
+        max_steps : int
+            The maximum number of lockstep steps simulated
+        turn_duration : float
+            The simulated time taken by a turn (s); a straight move takes
+            agent_time_step
+        record : bool
+            Whether to keep every agent's full trajectory, or only its final
+            state
+    """
+
+    _INITIAL_CAPACITY = 1024
+
+    def __init__(self, max_steps=100000, turn_duration=TURN_DURATION, record=True):
+        """Initializer for a new EnsembleEngine."""
+
+        self._max_steps = max_steps
+        self._turn_duration = turn_duration
+        self._record = record
+
+    def run(self, x0, y0, theta0, config, rng=None):
+        """Simulate one run per initial pose.
+
+        Arguments:
+            x0, y0 : array_like
+                The initial positions of the agents (mm)
+            theta0 : float or array_like
+                The initial headings of the agents (rad)
+            config : dict or str
+                A config dictionary as returned by
+                :func:`config_to_dict <atlantic_signatures.config_loader.config_to_dict>`,
+                or the path to a config file
+            rng : numpy.random.Generator
+                The random number generator of the run's measurement noise, by
+                default seeded from the config's Noise Properties
+
+        Returns:
+            ensemble : EnsembleTrajectory
+                The recorded poses and the outcome of every agent's run
+        """
+
+        if not isinstance(config, dict):
+            config = config_to_dict(Loader().read_config_file(config))
+
+        navigator = Navigator.from_cache(config, rng=rng, verbose=False)
+        field = navigator._field_calculator
+
+        strategy = navigator._secular_variation_strategy
+        possible_strategies = ['none', 'imprint']
+        if strategy not in possible_strategies:
+            raise ValueError(f"unrecognized secular variation strategy: '{strategy}', valid options: {possible_strategies}")
+
+        time_step = config['Create Properties']['agent_time_step']
+        angle_cutoff = config['Create Properties']['angle_cutoff']
+        bounds = config['Boundary Conditions']
+
+        goals = config['Goal Properties'].copy()
+        goals.pop('circuits', None)
+        x_goals, y_goals = np.array(list(goals.values()), dtype=float).T
+        goal_count = len(x_goals)
+
+        x, y, theta = np.broadcast_arrays(*(np.array(i, dtype=float) for i in (x0, y0, theta0)))
+        x, y, theta = x.ravel().copy(), y.ravel().copy(), theta.ravel().copy()
+        agents = len(x)
+        t = np.zeros(agents)
+        steps = np.zeros(agents, dtype=int)
+
+        # per-agent goal (0-indexed) and circuit (1-indexed) numbers
+        goal = np.zeros(agents, dtype=int)
+        circuit = np.ones(agents, dtype=int)
+
+        # per-agent magnetic signatures of every goal, updated when imprinting
+        beta_goals, gamma_goals = field.calculate(x_goals, y_goals, n=0)
+        signatures = np.empty((agents, goal_count, 2))
+        signatures[...] = np.stack((beta_goals, gamma_goals), axis=-1)
+
+        finished = np.zeros(agents, dtype=bool)
+        out_of_bounds = np.zeros(agents, dtype=bool)
+
+        if self._record:
+            poses = np.full((4, min(self._INITIAL_CAPACITY, self._max_steps), agents), np.nan)
+
+        for n in range(self._max_steps):
+            out_of_bounds |= ~finished & ((x < bounds['x_min']) | (x > bounds['x_max']) |
+                                          (y < bounds['y_min']) | (y > bounds['y_max']))
+            active = ~(finished | out_of_bounds)
+            if not active.any():
+                break
+
+            if self._record:
+                if n == poses.shape[1]:
+                    poses = np.concatenate((poses, np.full_like(poses, np.nan)), axis=1)
+                for row, value in zip(poses, (x, y, theta, t)):
+                    row[n, active] = value[active]
+            steps += active
+
+            # advance the goal and circuit numbers of agents that reached their goal
+            reached = active & (np.hypot(x_goals[goal] - x, y_goals[goal] - y) <= navigator._r_goal)
+            if reached.any():
+                idx = np.flatnonzero(reached)
+                if strategy == 'imprint':
+                    # imprint on the current magnetic signature for the goal that was just found
+                    signatures[idx, goal[idx]] = np.stack(
+                        field.calculate(x_goals[goal[idx]], y_goals[goal[idx]], n=circuit[idx]-1), axis=-1)
+                last = (goal[idx] == goal_count-1) & (circuit[idx] == navigator._circuits)
+                finished[idx[last]] = True
+                active &= ~finished
+                idx = idx[~last]
+                goal[idx] += 1
+                wrapped = idx[goal[idx] == goal_count]
+                goal[wrapped] = 0
+                circuit[wrapped] += 1
+                if not active.any():
+                    break
+
+            a = np.flatnonzero(active)
+            g = goal[a]
+            vx, vy = navigator._array_net_velocity(
+                x[a], y[a],
+                goal=(x_goals[g], y_goals[g]),
+                signature=(signatures[a, g, 0], signatures[a, g, 1]),
+                n=circuit[a]-1)
+            V = np.maximum(np.trunc(np.hypot(vx, vy)), MIN_SPEED)
+
+            # Small epsilon added to vx to avoid division by zero
+            vx = np.where(vx == 0, 1e-6, vx)
+
+            desired_angle = np.arctan2(vy, vx)
+            delta = np.copysign(np.arccos(np.cos(desired_angle - theta[a])), np.sin(desired_angle - theta[a]))
+            turn = np.abs(delta) > angle_cutoff
+
+            turning, straight = a[turn], a[~turn]
+            theta[turning] = (theta[turning] + TURN_GAIN * delta[turn] + np.pi) % (2*np.pi) - np.pi
+            t[turning] += self._turn_duration
+            x[straight] += time_step * V[~turn] * np.cos(theta[straight])
+            y[straight] += time_step * V[~turn] * np.sin(theta[straight])
+            t[straight] += time_step
+
+        if self._record:
+            poses = poses[:, :steps.max(initial=0)].copy()
+        else:
+            poses = (None, None, None, None)
+
+        return EnsembleTrajectory(*poses, steps=steps, goal=goal+1, circuit=circuit,
+                                  finished=finished, out_of_bounds=out_of_bounds,
+                                  final_x=x, final_y=y, final_theta=theta, final_t=t)
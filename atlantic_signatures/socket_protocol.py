@@ -1,11 +1,16 @@
 """
 API for sending messages to and from the Create
 """
+import asyncio
 import json
 from enum import IntEnum, IntFlag
+import select
 import socket
+import struct
 
-__all__ = ['BreakLoop', 'PACKETS', 'HEADERLEN', 'PORT', 'ALT_PORT', 'Protocol']
+__all__ = ['BreakLoop', 'PACKETS', 'HEADERLEN', 'PORT', 'ALT_PORT', 'POSE_STRUCT',
+           'HEARTBEAT_STRUCT', 'HEARTBEAT_INTERVAL', 'pack_pose', 'unpack_pose',
+           'Protocol', 'AsyncProtocol']
 
 
 class BreakLoop(Exception):
@@ -18,12 +23,20 @@ class PACKETS(IntFlag):
     DATA       = 0x04
     START      = 0x08
     CLOSE      = 0x10
+    POSE       = 0x20
+    STREAM     = 0x40
+    HEARTBEAT  = 0x80
+    TABLE      = 0x03  # every single bit is taken
 
     ACKCOMMAND = 0xfe
     ACKCONFIG  = 0xfd
     ACKDATA    = 0xfb
     ACKSTART   = 0xf7
     ACKCLOSE   = 0xef
+    ACKPOSE    = 0xdf
+    ACKSTREAM  = 0xbf
+    ACKHEARTBEAT = 0x7f
+    ACKTABLE   = 0xfc
 
     @classmethod
     def get_ack(cls, value: int) -> int:
@@ -45,6 +58,7 @@ class PACKETS(IntFlag):
 # Magic numbers
 HEADERLEN = 4
 MAXBYTES  = 10**HEADERLEN
+MAXCHUNK  = MAXBYTES - 1  # largest payload whose length fits in the header
 
 # Port 10,000 is the default port but we cannot guarantee that some other
 # process wont start using that port. Thus an alternative port: 10,001 is
@@ -52,6 +66,28 @@ MAXBYTES  = 10**HEADERLEN
 PORT = 10000
 ALT_PORT = 10001
 
+# Binary pose packets carry x, y, theta, the Vicon frame number and the host
+# timestamp as little-endian float64/uint64 fields. Being fixed-size, they are
+# sent without the ASCII length header used by the other packets.
+POSE_STRUCT = struct.Struct('<3dQd')
+
+# In streaming mode, poses are sent without per-packet acks. Instead, the
+# client periodically sends a heartbeat carrying the frame number of the last
+# pose it acted on.
+HEARTBEAT_STRUCT = struct.Struct('<Q')
+HEARTBEAT_INTERVAL = 1.0  # seconds
+
+FIXED_PAYLOAD_SIZES = {PACKETS.POSE: POSE_STRUCT.size, PACKETS.HEARTBEAT: HEARTBEAT_STRUCT.size}
+
+# Packets that are always sent bare, with neither header nor payload
+BARE_PACKETS = (PACKETS.START, PACKETS.CLOSE, PACKETS.STREAM)
+
+def pack_pose(x, y, theta, frame, timestamp):
+    return POSE_STRUCT.pack(x, y, theta, frame, timestamp)
+
+def unpack_pose(payload):
+    return POSE_STRUCT.unpack(payload)
+
 
 
 def _to_packet(pb, chunk):
@@ -59,22 +95,141 @@ def _to_packet(pb, chunk):
 
 def ipackets(pb, b=None):
     msglen = 0 if b is None else len(b)
-    if not msglen:
+    if pb in FIXED_PAYLOAD_SIZES:
+        yield bytes(PACKETS(pb)) + b
+
+    elif not msglen:
         yield pb
 
     else:
-        for i in range(0, msglen, MAXBYTES):
-            yield _to_packet(pb, b[i: i + MAXBYTES])
+        # a message longer than one chunk is split into full chunks, ending
+        # with a shorter (possibly empty) one
+        for i in range(0, msglen, MAXCHUNK):
+            yield _to_packet(pb, b[i: i + MAXCHUNK])
 
-        if not msglen % MAXBYTES:
+        if not msglen % MAXCHUNK:
             yield _to_packet(pb, b'')
 
 
+class FrameReader:
+    """
+    Reads packets from a socket into a reusable buffer.
+
+    Bytes are read with :meth:`socket.socket.recv_into` into a preallocated
+    buffer, looping until whole packets have arrived, and as many bytes as are
+    available are read at once, so several packets can be parsed from a single
+    read. Messages split into several chunks by :func:`ipackets` are
+    reassembled.
+
+    Payloads are returned as :class:`memoryview` objects into the buffer. They
+    are only valid until the next call to :meth:`read_packet`, and should be
+    copied (e.g. with ``bytes(payload)``) if they need to be kept.
+    """
+
+    def __init__(self, sock, size=2**16):
+        """Initializer for a new FrameReader."""
+
+        self._sock = sock
+        self._buf = bytearray(size)
+        self._view = memoryview(self._buf)
+        self._start = 0
+        self._end = 0
+
+    def _fill(self, n):
+        """Block until at least *n* unparsed bytes are buffered."""
+
+        while self._end - self._start < n:
+            if len(self._buf) - self._start < n:
+                # make room by moving the unparsed bytes to the front of the
+                # buffer, growing it if it is too small
+                unparsed = self._end - self._start
+                if len(self._buf) < n:
+                    buf = bytearray(max(n, 2*len(self._buf)))
+                    buf[:unparsed] = self._view[self._start:self._end]
+                    self._buf, self._view = buf, memoryview(buf)
+                else:
+                    self._view[:unparsed] = self._view[self._start:self._end]
+                self._start, self._end = 0, unparsed
+
+            nbytes = self._sock.recv_into(self._view[self._end:])
+            if not nbytes:
+                raise ConnectionError('The connection was closed by the other end')
+            self._end += nbytes
+
+    def _take(self, n):
+        """Return a view of the next *n* buffered bytes, blocking until they arrive."""
+
+        self._fill(n)
+        chunk = self._view[self._start:self._start + n]
+        self._start += n
+        return chunk
+
+    def _packet_size(self):
+        """
+        Return the size of the next buffered packet, or None if it has not been
+        completely buffered yet.
+        """
+
+        available = self._end - self._start
+        if not available:
+            return None
+
+        pb = self._buf[self._start]
+        if pb in BARE_PACKETS:
+            return 1
+        if pb in FIXED_PAYLOAD_SIZES:
+            size = 1 + FIXED_PAYLOAD_SIZES[pb]
+        elif available < 1 + HEADERLEN:
+            return None
+        else:
+            size = 1 + HEADERLEN + int(bytes(self._view[self._start + 1:self._start + 1 + HEADERLEN]))
+        return size if available >= size else None
+
+    def has_packet(self):
+        """Return True if a complete packet is already buffered."""
+
+        return self._packet_size() is not None
+
+    def read_packet(self):
+        """Read the next packet, returning its packet byte and payload."""
+
+        pb = self._take(1)[0]
+        if pb in BARE_PACKETS:
+            return pb, memoryview(b'')
+        if pb in FIXED_PAYLOAD_SIZES:
+            return pb, self._take(FIXED_PAYLOAD_SIZES[pb])
+
+        chunklen = int(bytes(self._take(HEADERLEN)))
+        chunk = self._take(chunklen)
+        if chunklen < MAXCHUNK:
+            return pb, chunk
+
+        # reassemble a multi-chunk message
+        message = bytearray(chunk)
+        while chunklen == MAXCHUNK:
+            if self._take(1)[0] != pb:
+                raise OSError('A multi-chunk message was interrupted by another packet')
+            chunklen = int(bytes(self._take(HEADERLEN)))
+            message += self._take(chunklen)
+        return pb, memoryview(message)
+
+
 class Protocol:
 
     def send_close(self):
         print('Ending connection')
-        self._send(bytes(PACKETS.CLOSE))
+        if not getattr(self, '_streaming', False):
+            self._send(bytes(PACKETS.CLOSE))
+            raise BreakLoop()
+
+        # while streaming, the acknowledgement could be interleaved with other
+        # packets, so wait for the other end to close the connection instead
+        self._send(bytes(PACKETS.CLOSE), ack=False)
+        try:
+            while self._client_sock.recv(4096):
+                pass
+        except OSError:
+            pass
         raise BreakLoop()
 
     def recv_close(self, payload):
@@ -84,26 +239,27 @@ class Protocol:
 
     # ----------- Helper Methods for sending and receiving --------------------
 
-    def _send(self, pb, b=None):
-        """Helper method for sending packets."""
+    def _send(self, pb, b=None, *, ack=True):
+        """Helper method for sending packets.
+
+        Unless *ack* is False, block until the packet is acknowledged.
+        """
         try:
             for sp in ipackets(pb, b):
-                self._client_sock.send(sp)
+                self._client_sock.sendall(sp)
 
-            if self._client_sock.recv(1) != PACKETS.get_ackb(pb):
+            if ack and self._client_sock.recv(1) != PACKETS.get_ackb(pb):
                 raise OSError('The last command was not properly acknowledged')
         except:
             self._client_sock.close()
             raise
 
     def _recv(self):
+        if not hasattr(self, '_reader'):
+            self._reader = FrameReader(self._client_sock)
+
         try:
-            d = self._client_sock.recv(1 + HEADERLEN)
-            pb, _headerlen = d[0], d[1:]
-            if _headerlen:
-                payload = self._client_sock.recv(int(_headerlen))
-            else:
-                payload = b''
+            pb, payload = self._reader.read_packet()
 
         except TimeoutError:
             self._client_sock.close()
@@ -113,3 +269,100 @@ class Protocol:
             raise
 
         return pb, payload
+
+    def _pending(self, timeout=0):
+        """
+        Return True if more data can be read without blocking, waiting up to
+        *timeout* seconds for it to arrive.
+        """
+        if hasattr(self, '_reader') and self._reader.has_packet():
+            return True
+        r, _, _ = select.select([self._client_sock], [], [], timeout)
+        return bool(r)
+
+
+
+class AsyncProtocol:
+    """
+    asyncio counterpart of :class:`Protocol`.
+
+    The connected socket (``self._client_sock``) is wrapped in an asyncio
+    stream by :meth:`_aopen`, after which packets are sent and received by
+    coroutines, so that several tasks can share the connection.
+    """
+
+    async def _aopen(self):
+        self._stream_reader, self._stream_writer = await asyncio.open_connection(sock=self._client_sock)
+
+    async def _run_tasks(self, *coros):
+        """Run *coros* as concurrent tasks until one of them ends or fails."""
+        tasks = [asyncio.create_task(coro) for coro in coros]
+        try:
+            done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+        for task in done:
+            task.result()  # re-raise the exception that ended the task, if any
+
+    _CLOSE_TIMEOUT = 5  # seconds
+
+    async def _asend_close(self):
+        print('Ending connection')
+        self._closing = True
+        await self._asend(bytes(PACKETS.CLOSE))
+
+        # the receiving task ends the session once the other end acknowledges
+        # or closes the connection, cancelling this wait
+        await asyncio.sleep(self._CLOSE_TIMEOUT)
+        raise BreakLoop()
+
+    async def _arecv_close(self):
+        print('Close packet was received and the close process has begun')
+        self._stream_writer.write(bytes(PACKETS.ACKCLOSE))
+        await self._stream_writer.drain()
+        raise BreakLoop()
+
+    # ----------- Helper Methods for sending and receiving --------------------
+
+    async def _asend(self, pb, b=None, *, ack=False):
+        """Helper coroutine for sending packets.
+
+        Acknowledgements are only waited for if *ack* is True, which is only
+        safe while no other task is receiving.
+        """
+        for sp in ipackets(pb, b):
+            self._stream_writer.write(sp)
+        await self._stream_writer.drain()
+
+        if ack and await self._stream_reader.readexactly(1) != PACKETS.get_ackb(pb):
+            raise OSError('The last command was not properly acknowledged')
+
+    async def _arecv(self):
+        read = self._stream_reader.readexactly
+
+        try:
+            pb = (await read(1))[0]
+        except asyncio.IncompleteReadError:
+            if getattr(self, '_closing', False):
+                raise BreakLoop()
+            raise
+        if pb == PACKETS.ACKCLOSE and getattr(self, '_closing', False):
+            raise BreakLoop()
+
+        if pb in BARE_PACKETS:
+            return pb, b''
+        if pb in FIXED_PAYLOAD_SIZES:
+            return pb, await read(FIXED_PAYLOAD_SIZES[pb])
+
+        chunklen = int(await read(HEADERLEN))
+        payload = await read(chunklen)
+        while chunklen == MAXCHUNK:
+            # reassemble a multi-chunk message
+            if (await read(1))[0] != pb:
+                raise OSError('A multi-chunk message was interrupted by another packet')
+            chunklen = int(await read(HEADERLEN))
+            payload += await read(chunklen)
+        return pb, payload
@@ -0,0 +1,212 @@
+"""
+The :mod:`atlantic_signatures.sweep` module implements parameter sweeps of
+headless simulations, fanned out across a pool of worker processes.
+
+The base config file is parsed once, in the parent process, and handed to
+each worker when it starts. Every task then only carries the handful of
+overridden options and a chunk of starting poses, which the worker simulates
+in lockstep with an :class:`EnsembleEngine
+<atlantic_signatures.simulation.EnsembleEngine>`. Per-run outcomes are
+gathered into a single columnar ``.npz`` file.
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+import copy
+import itertools
+import os
+
+import numpy as np
+
+from atlantic_signatures.config_loader import CONFIG_OPTIONS, Loader, QuantityConfigParser, config_to_dict
+from atlantic_signatures.simulation import EnsembleEngine
+from atlantic_signatures.units import ureg
+
+
+SWEEP_SECTIONS = ('Field Properties', 'Current Properties', 'Create Properties', 'Noise Properties')
+
+# Names of the per-run columns written to the result file, besides the swept
+# options
+RESULT_COLUMNS = ('x0', 'y0', 'theta0', 'outcome', 'steps', 'goal', 'circuit',
+                  'final_x', 'final_y', 'final_theta', 'final_t')
+
+
+def find_section(option):
+    """Return the config section that a sweepable *option* belongs to."""
+
+    option = option.lower()
+    for section, name in CONFIG_OPTIONS:
+        if name == option and section in SWEEP_SECTIONS:
+            return section
+    raise ValueError(f"unrecognized sweep option: '{option}', valid sections: {list(SWEEP_SECTIONS)}")
+
+
+def parse_values(section, option, spec):
+    """Parse the values an option is swept over, converted to base units.
+
+    *spec* is either a comma-separated list of values (e.g. ``'2, 5, 10
+    (degrees)'``) or a ``start:stop:num`` range of evenly spaced values (e.g.
+    ``'0:10:6 (degrees)'``). Units follow the config file conventions; values
+    without a unit take the option's default unit.
+    """
+
+    type_id, _, unit = CONFIG_OPTIONS.get((section, option), ('<string>', None, None))
+
+    if type_id == '<string>':
+        return [value.strip() for value in spec.split(',')]
+
+    parser = QuantityConfigParser()
+    parser[section] = {option: spec}
+    q = parser.getquantity(section, option, units='dimensionless' if unit is None else unit)
+    magnitudes = np.atleast_1d(q.m)
+
+    if ':' in spec:
+        if len(magnitudes) != 3:
+            raise ValueError(f"range for '{option}' should be given as start:stop:num, got: '{spec}'")
+        magnitudes = np.linspace(magnitudes[0], magnitudes[1], int(magnitudes[2]))
+
+    values = ureg.Quantity(magnitudes, q.units).to_base_units().m
+    if type_id == '<int>':
+        return [int(value) for value in values]
+    return [float(value) for value in values]
+
+
+def parse_range(spec):
+    """Parse a unitless list (``'a, b, c'``) or ``start:stop:num`` range."""
+
+    if ':' in spec:
+        start, stop, num = spec.split(':')
+        return np.linspace(float(start), float(stop), int(num))
+    return np.array([float(value) for value in spec.split(',')])
+
+
+_base_config = None
+
+def _init_worker(config):
+    """Cache the parsed base config in a worker process."""
+
+    global _base_config
+    _base_config = config
+
+def _run_chunk(overrides, x0, y0, theta0, max_steps, seed):
+    """Simulate a chunk of starting poses with some options overridden."""
+
+    config = copy.deepcopy(_base_config)
+    for (section, option), value in overrides.items():
+        config.setdefault(section, {})[option] = value
+
+    rng = np.random.default_rng(seed)  # independent measurement noise for every chunk
+    ensemble = EnsembleEngine(max_steps=max_steps, record=False).run(x0, y0, theta0, config, rng=rng)
+    return {
+        'outcome': ensemble.outcome,
+        'steps': ensemble.steps,
+        'goal': ensemble.goal,
+        'circuit': ensemble.circuit,
+        'final_x': ensemble.final_x,
+        'final_y': ensemble.final_y,
+        'final_theta': ensemble.final_theta,
+        'final_t': ensemble.final_t,
+        }
+
+
+class Sweep:
+    """
+    A parameter sweep over config options and starting poses.
+
+    Every combination of the swept option values is simulated from every
+    combination of starting poses.
+
+    Example usage:
+        >>> import importlib.resources
+        >>> config_file = importlib.resources.files('atlantic_signatures').joinpath('demo.cfg')
+        >>>
+        >>> from atlantic_signatures.sweep import Sweep
+        >>> sweep = Sweep(config_file, {'lambda': '0:10:3 (degrees)'}, x0=[-1000, 1000], y0=[-1500])
+        >>> results = sweep.run()
+
+    Parameters:
+        config_file : str
+            The base config file
+        options : dict
+            A mapping of option names to the values they are swept over, as
+            accepted by :func:`parse_values`
+        x0, y0 : array_like
+            The starting x- and y-coordinates to simulate from (mm)
+        theta0 : array_like
+            The starting headings to simulate from (rad)
+        max_steps : int
+            The maximum number of steps of each simulation
+        workers : int
+            The number of worker processes (default: one per CPU core)
+        chunk_size : int
+            The number of starting poses simulated together by one task
+    """
+
+    def __init__(self, config_file, options, x0, y0, theta0=(0.0,), max_steps=100000, workers=None, chunk_size=64):
+        """Initializer for a new Sweep."""
+
+        self._config = config_to_dict(Loader().read_config_file(config_file))
+
+        self._options = {}
+        for option, spec in options.items():
+            section = find_section(option)
+            self._options[(section, option.lower())] = parse_values(section, option.lower(), spec)
+
+        x0, y0, theta0 = np.meshgrid(np.atleast_1d(x0), np.atleast_1d(y0), np.atleast_1d(theta0), indexing='ij')
+        self._starts = np.stack((x0.ravel(), y0.ravel(), theta0.ravel()), axis=-1).astype(float)
+
+        self._max_steps = max_steps
+        self._workers = os.cpu_count() if workers is None else workers
+        self._chunk_size = chunk_size
+
+    def __len__(self):
+        combinations = 1
+        for values in self._options.values():
+            combinations *= len(values)
+        return combinations * len(self._starts)
+
+    def run(self):
+        """Run all simulations and return the per-run results as columns."""
+
+        keys = list(self._options)
+        combinations = list(itertools.product(*self._options.values()))
+        chunks = [self._starts[i:i + self._chunk_size] for i in range(0, len(self._starts), self._chunk_size)]
+
+        tasks = [(combination, chunk) for combination in combinations for chunk in chunks]
+
+        # every chunk gets its own noise generator, spawned from the noise
+        # seed of its combination if noise_seed is swept, or else from the
+        # base config's
+        base_seeds = np.random.SeedSequence(self._config.get('Noise Properties', {}).get('noise_seed'))
+        seeds = []
+        for combination in combinations:
+            noise_seed = dict(zip(keys, combination)).get(('Noise Properties', 'noise_seed'))
+            if noise_seed is None:
+                seeds += base_seeds.spawn(len(chunks))
+            else:
+                seeds += np.random.SeedSequence(noise_seed).spawn(len(chunks))
+        columns = {option: [] for _, option in keys}
+        columns.update({name: [] for name in RESULT_COLUMNS})
+
+        with ProcessPoolExecutor(max_workers=self._workers, initializer=_init_worker, initargs=(self._config,)) as executor:
+            futures = [
+                executor.submit(_run_chunk, dict(zip(keys, combination)), *chunk.T, self._max_steps, seed)
+                for (combination, chunk), seed in zip(tasks, seeds)
+                ]
+
+            for (combination, chunk), future in zip(tasks, futures):
+                result = future.result()
+                for (_, option), value in zip(keys, combination):
+                    columns[option].append(np.full(len(chunk), value))
+                columns['x0'].append(chunk[:, 0])
+                columns['y0'].append(chunk[:, 1])
+                columns['theta0'].append(chunk[:, 2])
+                for name, value in result.items():
+                    columns[name].append(value)
+
+        return {name: np.concatenate(value) for name, value in columns.items()}
+
+    @staticmethod
+    def save(fname, results):
+        """Save the results of :meth:`run` to a columnar ``.npz`` file."""
+
+        np.savez(fname, **results)
@@ -0,0 +1,342 @@
+"""
+The :mod:`atlantic_signatures.vicon_replay` module implements recording and
+replaying of Vicon DataStream sessions, so that the host can be run, tested and
+benchmarked without access to the Vicon system.
+
+A :class:`RecordingClient` wraps a connected ``ViconDataStream.Client`` and
+writes every frame's segment translations, rotations, occlusion flags and
+latency to a compact binary recording. A :class:`ReplayClient` implements the
+subset of ``ViconDataStream.Client`` used by the :class:`Host
+<atlantic_signatures.host.Host>`, serving the frames of a recording either at
+their recorded rate or as fast as possible.
+
+A recording consists of a short header followed by fixed-size frame records:
+
+    ======== ============================================================
+    Field    Contents
+    ======== ============================================================
+    magic    ``b'ATSVICON'``
+    version  ``uint16``, the recording format version
+    length   ``uint32``, the length of the metadata
+    metadata UTF-8 encoded JSON: the SDK version and the subject names
+    records  :data:`RECORD_DTYPE` records, one per frame and queried subject
+    ======== ============================================================
+"""
+
+import json
+import struct
+import threading
+import time
+
+import numpy as np
+
+
+RECORDING_MAGIC = b'ATSVICON'
+RECORDING_VERSION = 1
+HEADER_STRUCT = struct.Struct('<8sHI')
+
+TRANSLATION_OCCLUDED = 0x01
+ROTATION_OCCLUDED = 0x02
+
+# One record per frame and subject, little-endian and unpadded
+RECORD_DTYPE = np.dtype([
+    ('time', '<f8'),            # seconds since the first recorded frame
+    ('frame', '<u8'),           # the Vicon frame number
+    ('subject', '<u2'),         # index into the recorded subject names
+    ('occluded', 'u1'),         # TRANSLATION_OCCLUDED | ROTATION_OCCLUDED
+    ('translation', '<f8', 3),  # global segment translation (mm)
+    ('rotation', '<f8', 3),     # global segment rotation, Euler XYZ (rad)
+    ('latency', '<f8'),         # total system latency (s), NaN if unknown
+    ])
+
+
+class ReplayError(Exception):
+    """Raised when a replay client can't serve a request."""
+
+
+class EndOfRecording(ReplayError):
+    """Raised when a frame is requested past the end of a recording."""
+
+
+class RecordingClient:
+    """
+    A wrapper around a Vicon DataStream client recording the frames it reads.
+
+    All calls are forwarded to the wrapped client. The results of the segment
+    translation and rotation queries made after each ``GetFrame`` are written
+    to the recording when the next frame is fetched, or when the recording is
+    closed.
+
+    Parameters:
+        vicon_client : ViconDataStream.Client
+            A connected Vicon DataStream client
+        fname : str
+            The recording file to write
+    """
+
+    def __init__(self, vicon_client, fname):
+        """Initializer for a new RecordingClient."""
+
+        self._vicon_client = vicon_client
+        self._file = open(fname, 'wb')
+        self._lock = threading.Lock()
+        self._subjects = None
+        self._pending = {}
+        self._frame = None
+        self._time = None
+        self._latency = np.nan
+        self._t0 = None
+
+    def __getattr__(self, name):
+        return getattr(self._vicon_client, name)
+
+    @property
+    def name(self):
+        """The name of the recording file."""
+
+        return self._file.name
+
+    def _write_header(self):
+        self._subjects = list(self._vicon_client.GetSubjectNames())
+        metadata = json.dumps({
+            'version': list(self._vicon_client.GetVersion()),
+            'subjects': self._subjects,
+            }).encode('utf-8')
+        self._file.write(HEADER_STRUCT.pack(RECORDING_MAGIC, RECORDING_VERSION, len(metadata)))
+        self._file.write(metadata)
+
+    def _flush(self):
+        if not self._pending:
+            return
+
+        records = np.zeros(len(self._pending), dtype=RECORD_DTYPE)
+        records['time'] = self._time
+        records['frame'] = self._frame
+        records['latency'] = self._latency
+        for i, (subject, values) in enumerate(self._pending.items()):
+            records['subject'][i] = subject
+            for key in ('translation', 'rotation', 'occluded'):
+                records[key][i] = values.get(key, 0)
+        self._file.write(records.tobytes())
+        self._pending = {}
+
+    def _pending_record(self, subject_name):
+        if subject_name not in self._subjects:
+            self._subjects.append(subject_name)  # not a subject when the recording started
+        return self._pending.setdefault(self._subjects.index(subject_name), {})
+
+    def GetFrame(self):
+        result = self._vicon_client.GetFrame()
+        t = time.perf_counter()
+
+        with self._lock:
+            if self._file.closed:
+                return result
+            self._flush()
+            if self._subjects is None:
+                self._write_header()
+                self._t0 = t
+            self._time = t - self._t0
+            self._frame = self._vicon_client.GetFrameNumber()
+            try:
+                self._latency = self._vicon_client.GetLatencyTotal()
+            except Exception:
+                self._latency = np.nan
+        return result
+
+    def GetSegmentGlobalTranslation(self, subject_name, segment_name):
+        translation, occluded = self._vicon_client.GetSegmentGlobalTranslation(subject_name, segment_name)
+        with self._lock:
+            if not self._file.closed:
+                record = self._pending_record(subject_name)
+                record['translation'] = translation
+                record['occluded'] = record.get('occluded', 0) | (TRANSLATION_OCCLUDED if occluded else 0)
+        return translation, occluded
+
+    def GetSegmentGlobalRotationEulerXYZ(self, subject_name, segment_name):
+        rotation, occluded = self._vicon_client.GetSegmentGlobalRotationEulerXYZ(subject_name, segment_name)
+        with self._lock:
+            if not self._file.closed:
+                record = self._pending_record(subject_name)
+                record['rotation'] = rotation
+                record['occluded'] = record.get('occluded', 0) | (ROTATION_OCCLUDED if occluded else 0)
+        return rotation, occluded
+
+    def close(self):
+        """Write the last frame and close the recording."""
+
+        with self._lock:
+            if self._file.closed:
+                return
+            self._flush()
+            if self._subjects is None:
+                self._write_header()
+            self._file.close()
+
+
+def read_recording(fname):
+    """
+    Read a recording, returning its metadata and its records as an array of
+    :data:`RECORD_DTYPE`.
+    """
+
+    with open(fname, 'rb') as f:
+        magic, version, length = HEADER_STRUCT.unpack(f.read(HEADER_STRUCT.size))
+        if magic != RECORDING_MAGIC:
+            raise ReplayError(f'{fname} is not a Vicon recording')
+        if version != RECORDING_VERSION:
+            raise ReplayError(f'Unsupported Vicon recording version: {version}')
+        metadata = json.loads(f.read(length))
+        records = np.fromfile(f, dtype=RECORD_DTYPE)
+    return metadata, records
+
+
+class StandInClient:
+    """
+    A base for stand-ins of ``ViconDataStream.Client``.
+
+    Connection and stream setup calls are accepted and ignored. Subclasses
+    implement fetching frames and the pose queries made by the :class:`Host
+    <atlantic_signatures.host.Host>`.
+    """
+
+    _version = (0, 0, 0)
+
+    def Connect(self, hostname):
+        pass
+
+    def IsConnected(self):
+        return True
+
+    def Disconnect(self):
+        pass
+
+    def GetVersion(self):
+        return self._version
+
+    def SetBufferSize(self, buffer_size):
+        pass
+
+    def EnableSegmentData(self):
+        pass
+
+    def EnableMarkerData(self):
+        pass
+
+    def EnableUnlabeledMarkerData(self):
+        pass
+
+    def SetStreamMode(self, stream_mode):
+        pass
+
+
+class ReplayClient(StandInClient):
+    """
+    A stand-in for ``ViconDataStream.Client`` serving the frames of a
+    recording.
+
+    Only the calls made by the :class:`Host <atlantic_signatures.host.Host>`
+    are implemented.
+
+    Example usage:
+        >>> from atlantic_signatures.vicon_replay import ReplayClient
+        >>> client = ReplayClient('session.vicon', realtime=False)
+        >>> client.GetFrame()
+        True
+        >>> client.GetSegmentGlobalTranslation('Create2', 'Create2')
+        ((-1012.4, 1503.2, 61.3), False)
+
+    Parameters:
+        fname : str
+            The recording file to replay
+        realtime : bool
+            If True, ``GetFrame`` waits until the next frame is due at its
+            recorded rate, like a Vicon client in ServerPush mode. Otherwise,
+            frames are served as fast as they are requested.
+        loop : bool
+            If True, the recording is replayed endlessly. Frame numbers keep
+            increasing from one pass to the next. Otherwise,
+            :class:`EndOfRecording` is raised once it is exhausted.
+    """
+
+    def __init__(self, fname, realtime=True, loop=False):
+        """Initializer for a new ReplayClient."""
+
+        metadata, self._records = read_recording(fname)
+        if len(self._records) == 0:
+            raise ReplayError(f'The Vicon recording {fname} contains no frames')
+
+        self._version = tuple(metadata['version'])
+        self._subjects = metadata['subjects']
+        self._realtime = realtime
+        self._loop = loop
+
+        # records of the same frame are contiguous
+        frames = self._records['frame']
+        self._frame_starts = np.flatnonzero(np.r_[True, frames[1:] != frames[:-1]])
+        self._frame_stops = np.r_[self._frame_starts[1:], len(frames)]
+
+        # offsets added to the frame numbers and times of every further pass
+        # through the recording
+        period = np.median(np.diff(self._records['time'][self._frame_starts])) if len(self._frame_starts) > 1 else 0.0
+        self._frame_span = int(frames[-1] - frames[0]) + 1
+        self._time_span = float(self._records['time'][-1]) + period
+
+        self._index = -1
+        self._pass = 0
+        self._current = None
+        self._t0 = None
+
+    def GetFrame(self):
+        self._index += 1
+        if self._index == len(self._frame_starts):
+            if not self._loop:
+                raise EndOfRecording('The end of the Vicon recording was reached')
+            self._index = 0
+            self._pass += 1
+
+        start, stop = self._frame_starts[self._index], self._frame_stops[self._index]
+        self._current = self._records[start:stop]
+
+        if self._realtime:
+            now = time.perf_counter()
+            if self._t0 is None:
+                self._t0 = now
+            delay = self._t0 + self._pass * self._time_span + self._current['time'][0] - now
+            if delay > 0:
+                time.sleep(delay)
+        return True
+
+    def _frame(self):
+        if self._current is None:
+            raise ReplayError('No frame has been fetched from the Vicon recording')
+        return self._current
+
+    def _subject_record(self, subject_name):
+        frame = self._frame()
+        try:
+            subject = self._subjects.index(subject_name)
+        except ValueError:
+            raise ReplayError(f'Unknown subject: {subject_name}') from None
+        match = frame[frame['subject'] == subject]
+        if len(match) == 0:
+            raise ReplayError(f'The subject {subject_name} was not recorded in frame {self.GetFrameNumber()}')
+        return match[0]
+
+    def GetFrameNumber(self):
+        return int(self._frame()['frame'][0]) + self._pass * self._frame_span
+
+    def GetLatencyTotal(self):
+        return float(self._frame()['latency'][0])
+
+    def GetSubjectNames(self):
+        self._frame()
+        return list(self._subjects)
+
+    def GetSegmentGlobalTranslation(self, subject_name, segment_name):
+        record = self._subject_record(subject_name)
+        return tuple(float(v) for v in record['translation']), bool(record['occluded'] & TRANSLATION_OCCLUDED)
+
+    def GetSegmentGlobalRotationEulerXYZ(self, subject_name, segment_name):
+        record = self._subject_record(subject_name)
+        return tuple(float(v) for v in record['rotation']), bool(record['occluded'] & ROTATION_OCCLUDED)
@@ -0,0 +1,335 @@
+"""
+The :mod:`atlantic_signatures.virtual_create` module implements a virtual
+iRobot Create2 listening on a pseudo-terminal, so that the client and host can
+be run closed-loop on a single Linux machine, without any hardware.
+
+A :class:`VirtualCreate` decodes the Open Interface commands written to its
+serial port by a :class:`Create <atlantic_signatures.create.Create>` and
+integrates the resulting differential-drive motion. A :class:`VirtualTracker`
+stands in for the Vicon system, reporting the virtual Create's pose to the
+:class:`Host <atlantic_signatures.host.Host>` at a fixed frame rate.
+
+Example usage:
+    >>> from atlantic_signatures.virtual_create import VirtualCreate, VirtualTracker
+    >>> from atlantic_signatures.host import Host
+    >>> create = VirtualCreate(x0=-1000, y0=-1500)
+    >>> create.port  # pass this to the client, e.g. Client(host, serialport=create.port)
+    '/dev/pts/3'
+    >>> host = Host(config_file, host='127.0.0.1', vicon_client=VirtualTracker(create))
+"""
+
+from collections import deque
+from math import pi
+import os
+import select
+import struct
+import threading
+import time
+import tty
+
+from atlantic_signatures.create import Create, OPCODES, SENSOR_FORMATS, SENSORS, STREAM_HEADER
+from atlantic_signatures.prediction import advance_pose
+from atlantic_signatures.vicon_replay import StandInClient
+
+
+# Number of data bytes following each supported opcode
+OPCODE_DATA_BYTES = {
+    OPCODES.START: 0,
+    OPCODES.RESET: 0,
+    OPCODES.STOP: 0,
+    OPCODES.SAFE: 0,
+    OPCODES.FULL: 0,
+    OPCODES.DRIVE: 4,
+    OPCODES.DRIVE_DIRECT: 4,
+    OPCODES.PAUSE_RESUME_STREAM: 1,
+    }
+
+STREAM_PERIOD = 0.015  # Streamed sensor data is sent every 15 ms
+
+DRIVE_STRUCT = struct.Struct('>2h')
+
+# Special DRIVE radii
+STRAIGHT_RADII = (32767, -32768)
+ROTATE_CW_RADIUS = -1
+ROTATE_CCW_RADIUS = 1
+
+MAX_WHEEL_SPEED = 500  # mm/s
+
+
+class VirtualCreate:
+    """
+    A virtual iRobot Create2 driven through a pseudo-terminal.
+
+    A background thread reads the commands written to :attr:`port`. DRIVE and
+    DRIVE_DIRECT commands set the wheel speeds while the Create is in safe or
+    full mode; its pose is integrated exactly between commands, assuming the
+    wheel speeds change instantly. Requested sensor packets are streamed back
+    every 15 ms.
+
+    Parameters:
+        x0, y0 : float
+            The starting position (mm)
+        theta0 : float
+            The starting heading (rad)
+        clock : callable
+            The time source (s), :func:`time.perf_counter` by default
+    """
+
+    def __init__(self, x0=0.0, y0=0.0, theta0=0.0, clock=time.perf_counter):
+        """Initializer for a new VirtualCreate."""
+
+        self._clock = clock
+        self._lock = threading.Lock()
+
+        self._x, self._y, self._theta = float(x0), float(y0), float(theta0)
+        self._distance = [0.0, 0.0]  # distance travelled by the left and right wheels
+        self._vl = self._vr = 0.0
+        self._t = clock()
+        self.mode = 'off'
+        self.commands = 0
+        self.unknown_bytes = 0
+
+        # the slave end stays open, so that the Create can be reconnected to
+        self._master, self._slave = os.openpty()
+        tty.setraw(self._slave)
+        self.port = os.ttyname(self._slave)
+
+        self._buffer = bytearray()
+        self._streamed_sensors = ()
+        self._streaming = False
+        self._next_stream = None
+        self._reported = {SENSORS.DISTANCE: 0, SENSORS.ANGLE: 0}
+        self._stopped = False
+        self._thread = threading.Thread(target=self._serve, name='virtual-create', daemon=True)
+        self._thread.start()
+
+    def _serve(self):
+        while not self._stopped:
+            timeout = 0.1
+            if self._streaming:
+                timeout = max(0.0, self._next_stream - time.perf_counter())
+            r, _, _ = select.select([self._master], [], [], timeout)
+            try:
+                if r:
+                    self.feed(os.read(self._master, 1024))
+                if self._streaming and time.perf_counter() >= self._next_stream:
+                    self._next_stream += STREAM_PERIOD
+                    os.write(self._master, self.stream_frame())
+            except OSError:
+                break
+
+    def feed(self, data):
+        """Decode the commands in *data*, written to the serial port."""
+
+        self._buffer += data
+        while self._buffer:
+            opcode = self._buffer[0]
+            if opcode == OPCODES.STREAM:
+                if len(self._buffer) < 2:
+                    break
+                size = 2 + self._buffer[1]
+            elif opcode in OPCODE_DATA_BYTES:
+                size = 1 + OPCODE_DATA_BYTES[opcode]
+            else:
+                del self._buffer[0]
+                self.unknown_bytes += 1
+                continue
+
+            if len(self._buffer) < size:
+                break
+            self._execute(OPCODES(opcode), bytes(self._buffer[1:size]))
+            del self._buffer[:size]
+
+    def _execute(self, opcode, data):
+        with self._lock:
+            self._advance()
+            self.commands += 1
+
+            match opcode:
+                case OPCODES.START:
+                    self.mode = 'passive'
+                    self._vl = self._vr = 0.0
+                case OPCODES.RESET | OPCODES.STOP:
+                    self.mode = 'off'
+                    self._vl = self._vr = 0.0
+                case OPCODES.SAFE:
+                    self.mode = 'safe'
+                case OPCODES.FULL:
+                    self.mode = 'full'
+                case OPCODES.DRIVE if self.mode in ('safe', 'full'):
+                    self._vl, self._vr = self.wheel_speeds(*DRIVE_STRUCT.unpack(data))
+                case OPCODES.DRIVE_DIRECT if self.mode in ('safe', 'full'):
+                    vr, vl = DRIVE_STRUCT.unpack(data)
+                    self._vl, self._vr = self._clip(vl), self._clip(vr)
+                case OPCODES.STREAM if self.mode != 'off':
+                    self._streamed_sensors = tuple(SENSORS(sensor) for sensor in data[1:] if sensor in SENSOR_FORMATS)
+                    self._streaming = bool(self._streamed_sensors)
+                    self._next_stream = time.perf_counter()
+                case OPCODES.PAUSE_RESUME_STREAM:
+                    self._streaming = bool(data[0]) and bool(self._streamed_sensors)
+                    self._next_stream = time.perf_counter()
+
+            if self.mode == 'off':
+                self._streaming = False
+
+    @staticmethod
+    def _clip(v):
+        return float(min(max(v, -MAX_WHEEL_SPEED), MAX_WHEEL_SPEED))
+
+    @classmethod
+    def wheel_speeds(cls, v, r):
+        """
+        Return the left and right wheel speeds (mm/s) of a DRIVE command with
+        velocity *v* (mm/s) and turn radius *r* (mm).
+        """
+
+        v = cls._clip(v)
+        if r in STRAIGHT_RADII:
+            return v, v
+        if r == ROTATE_CW_RADIUS:
+            return v, -v
+        if r == ROTATE_CCW_RADIUS:
+            return -v, v
+
+        # positive radii turn counter-clockwise
+        half_shaft = Create._SHAFT_LENGTH / 2
+        return v * (r - half_shaft) / r, v * (r + half_shaft) / r
+
+    def _advance(self):
+        """Integrate the pose up to the current time."""
+
+        t = self._clock()
+        dt, self._t = t - self._t, t
+        if dt <= 0:
+            return
+
+        v = (self._vl + self._vr) / 2
+        w = (self._vr - self._vl) / Create._SHAFT_LENGTH
+        self._x, self._y, self._theta = advance_pose(self._x, self._y, self._theta, v, w, dt)
+
+        self._distance[0] += self._vl * dt
+        self._distance[1] += self._vr * dt
+
+    def pose(self):
+        """Return the current pose: x, y (mm) and theta (rad)."""
+
+        with self._lock:
+            self._advance()
+            return self._x, self._y, self._theta
+
+    def encoder_counts(self):
+        """
+        Return the current left and right wheel encoder counts, which wrap
+        around like the Create's 16-bit counters.
+        """
+
+        with self._lock:
+            self._advance()
+            return tuple(
+                round(d / (pi * Create._WHEEL_DIAMETER) * Create._ENCODER_COUNTS) % 2**16
+                for d in self._distance
+                )
+
+    def stream_frame(self):
+        """
+        Return a frame of streamed sensor data, holding the current value of
+        each streamed sensor packet.
+        """
+
+        left, right = self.encoder_counts()
+        with self._lock:
+            distance = (self._distance[0] + self._distance[1]) / 2
+            angle = (self._distance[1] - self._distance[0]) / Create._SHAFT_LENGTH * 180 / pi
+
+            payload = bytearray()
+            for sensor in self._streamed_sensors:
+                match sensor:
+                    case SENSORS.LEFT_ENCODER_COUNTS:
+                        value = left
+                    case SENSORS.RIGHT_ENCODER_COUNTS:
+                        value = right
+                    case SENSORS.DISTANCE | SENSORS.ANGLE:
+                        # change since the last report, in mm or degrees
+                        total = round(distance if sensor == SENSORS.DISTANCE else angle)
+                        value, self._reported[sensor] = total - self._reported[sensor], total
+                payload += bytes([sensor]) + struct.pack(SENSOR_FORMATS[sensor][0], value)
+
+        frame = bytes([STREAM_HEADER, len(payload)]) + payload
+        return frame + bytes([-sum(frame) & 0xff])
+
+    @property
+    def wheel_velocities(self):
+        """The current left and right wheel speeds (mm/s)."""
+
+        return self._vl, self._vr
+
+    def close(self):
+        """Stop serving commands and close the pseudo-terminal."""
+
+        self._stopped = True
+        self._thread.join()
+        os.close(self._master)
+        os.close(self._slave)
+
+
+class VirtualTracker(StandInClient):
+    """
+    A stand-in for ``ViconDataStream.Client`` tracking a :class:`VirtualCreate`.
+
+    Like a Vicon client in ServerPush mode, ``GetFrame`` waits for the next
+    frame at a fixed frame rate. Frames report the pose the Create had
+    *latency* seconds earlier. The Create is never occluded.
+
+    Parameters:
+        create : VirtualCreate
+            The virtual Create to track
+        frame_rate : float
+            The number of frames per second
+        subject : str
+            The subject name the Create is tracked as
+        latency : float
+            The simulated latency of the tracking system (s)
+    """
+
+    def __init__(self, create, frame_rate=100.0, subject='Create2', latency=0.0):
+        """Initializer for a new VirtualTracker."""
+
+        self._create = create
+        self._period = 1 / frame_rate
+        self._subject = subject
+        self._latency = latency
+        self._frame_number = 0
+        self._poses = deque()
+        self._pose = None
+        self._next_frame = None
+
+    def GetFrame(self):
+        now = time.perf_counter()
+        if self._next_frame is None or now > self._next_frame + self._period:
+            self._next_frame = now  # skip the frames that were missed
+        elif now < self._next_frame:
+            time.sleep(self._next_frame - now)
+        self._next_frame += self._period
+
+        self._frame_number += 1
+        now = time.perf_counter()
+        self._poses.append((now, self._create.pose()))
+        while len(self._poses) > 1 and self._poses[1][0] <= now - self._latency:
+            self._poses.popleft()
+        self._pose = self._poses[0][1]
+        return True
+
+    def GetFrameNumber(self):
+        return self._frame_number
+
+    def GetLatencyTotal(self):
+        return self._latency
+
+    def GetSubjectNames(self):
+        return [self._subject]
+
+    def GetSegmentGlobalTranslation(self, subject_name, segment_name):
+        return (self._pose[0], self._pose[1], 0.0), False
+
+    def GetSegmentGlobalRotationEulerXYZ(self, subject_name, segment_name):
+        return (0.0, 0.0, self._pose[2]), False